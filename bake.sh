@@ -0,0 +1,53 @@
+#!/bin/bash
+# 镜像构建时执行一次(见Dockerfile), 把每次启动都一样的准备工作固化到镜像层:
+#   VNC密码、Caido数据目录(含CA证书)、系统/NSS证书库、Caido项目
+# 完成后写入 ~/.sandbox_baked, entrypoint.sh 发现该文件就跳过这些步骤, 只做登录和选择项目
+set -e
+
+CAIDO_PORT=${CAIDO_PORT:-8080}
+CA_CERT_PATH="/usr/local/share/ca-certificates/caido-ca.crt"
+BAKED_MARKER="$HOME/.sandbox_baked"
+
+# VNC密码
+mkdir -p ~/.vnc && echo 123456 | vncpasswd -f >~/.vnc/passwd && chmod 600 ~/.vnc/passwd
+
+# 首次启动Caido, 生成数据目录和CA证书
+caido-cli --no-sync --no-open --allow-guests --listen 127.0.0.1:$CAIDO_PORT >/dev/null 2>&1 &
+CAIDO_PID=$!
+for _ in $(seq 600); do
+  curl -s -o /dev/null --head http://localhost:$CAIDO_PORT/ca.crt && break
+  sleep 0.1
+done
+
+# 证书写入系统和NSS数据库(浏览器等)
+sudo curl -s http://localhost:$CAIDO_PORT/ca.crt -o "$CA_CERT_PATH"
+sudo update-ca-certificates >/dev/null 2>&1 || true
+rm -rf ~/.pki/nssdb
+mkdir -p ~/.pki/nssdb
+certutil -N -d sql:$HOME/.pki/nssdb --empty-password
+certutil -A -n "Testing Root CA" -t "C,," -i $CA_CERT_PATH -d sql:$HOME/.pki/nssdb
+
+# 创建持久项目(不是temporary), 运行时只需选择它
+TOKEN=$(curl -s -X POST \
+  -H "Content-Type: application/json" \
+  -d '{"query":"mutation LoginAsGuest { loginAsGuest { token { accessToken } } }"}' \
+  http://localhost:$CAIDO_PORT/graphql | jq -r '.data.loginAsGuest.token.accessToken')
+PROJECT_ID=$(curl -s -X POST \
+  -H "Content-Type: application/json" \
+  -H "Authorization: Bearer $TOKEN" \
+  -d '{"query":"mutation CreateProject { createProject(input: {name: \"sandbox\", temporary: false}) { project { id } } }"}' \
+  http://localhost:$CAIDO_PORT/graphql | jq -r '.data.createProject.project.id')
+if [ -z "$PROJECT_ID" ] || [ "$PROJECT_ID" == "null" ]; then
+  echo "Failed to create Caido project."
+  exit 1
+fi
+
+# 正常退出, 让Caido把数据写回磁盘
+kill $CAIDO_PID
+wait $CAIDO_PID || true
+
+cat >"$BAKED_MARKER" <<EOF
+BAKED_PROJECT_ID=$PROJECT_ID
+BAKED_CA_CERT=$CA_CERT_PATH
+EOF
+echo "Baked sandbox state: $(cat $BAKED_MARKER | tr '\n' ' ')"
@@ -1,6 +1,6 @@
 # 等待MCP就绪
 pwd
 while ! curl -s --head http://localhost:8000/ >/dev/null; do
-  sleep 1
+  sleep 0.2
 done
 
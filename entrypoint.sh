@@ -12,74 +12,168 @@ export CAIDO_PORT=8080
 export CODE_PORT=9090
 export BROWSER_PORT=9222
 export MCP_PORT=8000
+export PENTEST_LOGGER_SOCKET=${PENTEST_LOGGER_SOCKET:-/tmp/penetration_logger.sock}
+
+# 镜像构建时由 bake.sh 固化的状态(VNC密码、Caido证书/NSS库、Caido项目), 存在则走快速路径
+BAKED_MARKER=~/.sandbox_baked
+if [ -f "$BAKED_MARKER" ]; then
+  source "$BAKED_MARKER"
+fi
+
+# 启动日志服务: 初始化脚本、MCP、所有Jupyter内核共用同一份渗透日志
+python3 -m toolset.logger.service --socket $PENTEST_LOGGER_SOCKET >/dev/null 2>&1 &
+
+# 启动耗时记录: 每个阶段一行 "名称 开始 结束", 就绪后写入 ~/Workspace/logs/boot_timings.json
+BOOT_START=$EPOCHREALTIME
+BOOT_TIMINGS=$(mktemp)
+phase() {  # phase <名称> <命令...>
+  local name=$1 start=$EPOCHREALTIME
+  shift
+  "$@"
+  echo "$name $start $EPOCHREALTIME" >>$BOOT_TIMINGS
+}
+# 等待检查命令成功, 间隔从 50ms 逐步增加到 500ms, 而不是固定 sleep 1
+wait_for() {  # wait_for <超时秒数> <检查命令...>
+  local deadline=$((EPOCHSECONDS + $1)) delays=(0.05 0.1 0.2 0.3 0.5) i=0
+  shift
+  until "$@" >/dev/null 2>&1; do
+    if [ $EPOCHSECONDS -ge $deadline ]; then
+      echo "Timed out waiting for: $*"
+      return 1
+    fi
+    sleep ${delays[$i]}
+    if [ $i -lt $((${#delays[@]} - 1)) ]; then i=$((i + 1)); fi
+  done
+}
+http_ok() { curl -s -o /dev/null --head --max-time 1 "$1"; }
+port_open() { (echo >/dev/tcp/127.0.0.1/$1) 2>/dev/null; }
+vnc_ready() { [ -n "${NO_VISION}" ] || port_open $VNC_PORT; }
 
 # 启动dbus
 # eval $(dbus-launch --sh-syntax)
 # echo "export DBUS_SESSION_BUS_ADDRESS=$DBUS_SESSION_BUS_ADDRESS" >> ~/.myrc
 
-# 启动VNC
-if [ -z "${NO_VISION}" ]; then
-  mkdir -p ~/.vnc && echo 123456 | vncpasswd -f >~/.vnc/passwd && chmod 600 ~/.vnc/passwd
+start_vnc() {
+  if [ -z "${BAKED_PROJECT_ID}" ] || [ ! -f ~/.vnc/passwd ]; then
+    mkdir -p ~/.vnc && echo 123456 | vncpasswd -f >~/.vnc/passwd && chmod 600 ~/.vnc/passwd
+  fi
   vncserver $DISPLAY -rfbport $VNC_PORT -geometry 1920x1080 -depth 24 -localhost no -xstartup /usr/bin/startxfce4
-fi
+}
 
-# 运行Caido
-caido-cli --no-sync --no-open --allow-guests --listen 0.0.0.0:$CAIDO_PORT >/dev/null 2>&1 &
-while ! curl -s --head http://localhost:$CAIDO_PORT/ca.crt >/dev/null; do
-  sleep 1
-done
-# 下载Caido证书
-CA_CERT_PATH="/usr/local/share/ca-certificates/caido-ca.crt"
-echo "Downloading certificate to $CA_CERT_PATH..."
-sudo curl -s http://localhost:$CAIDO_PORT/ca.crt -o "$CA_CERT_PATH"
-# 将Caido证书添加到NSS数据库(浏览器等)
-rm -rf ~/.pki/nssdb
-mkdir -p ~/.pki/nssdb
-certutil -N -d sql:$HOME/.pki/nssdb --empty-password
-certutil -A -n "Testing Root CA" -t "C,," -i $CA_CERT_PATH -d sql:$HOME/.pki/nssdb
-# 获取Caido Token
-export CAIDO_TOKEN=$(curl -s -X POST \
-  -H "Content-Type: application/json" \
-  -d '{"query":"mutation LoginAsGuest { loginAsGuest { token { accessToken } } }"}' \
-  http://localhost:$CAIDO_PORT/graphql | jq -r '.data.loginAsGuest.token.accessToken')
-if [ -z "$CAIDO_TOKEN" ] || [ "$CAIDO_TOKEN" == "null" ]; then
-  echo "Failed to get API token from Caido."
-  exit 1
-fi
-# 创建和选择Caido项目
-CREATE_PROJECT_RESPONSE=$(curl -s -X POST \
-  -H "Content-Type: application/json" \
-  -H "Authorization: Bearer $CAIDO_TOKEN" \
-  -d '{"query":"mutation CreateProject { createProject(input: {name: \"sandbox\", temporary: true}) { project { id } } }"}' \
-  http://localhost:$CAIDO_PORT/graphql)
-PROJECT_ID=$(echo $CREATE_PROJECT_RESPONSE | jq -r '.data.createProject.project.id')
-echo "Selecting Caido project..."
-curl -s -X POST \
-  -H "Content-Type: application/json" \
-  -H "Authorization: Bearer $CAIDO_TOKEN" \
-  -d '{"query":"mutation SelectProject { selectProject(id: \"'$PROJECT_ID'\") { currentProject { project { id } } } }"}' \
-  http://localhost:$CAIDO_PORT/graphql
+start_caido() {
+  caido-cli --no-sync --no-open --allow-guests --listen 0.0.0.0:$CAIDO_PORT >/dev/null 2>&1 &
+  wait_for 120 http_ok http://localhost:$CAIDO_PORT/ca.crt
+}
 
-# 启动浏览器显示Caido
-if [ -z "${NO_VISION}" ]; then
-  chrome --no-sandbox --app=http://localhost:$CAIDO_PORT/ --user-data-dir="$HOME/.config/chromium-caido" --test-type --window-position=200,200 --window-size=1200,800 >/dev/null 2>&1 &
-fi
+install_caido_ca() {
+  # 下载Caido证书
+  CA_CERT_PATH="/usr/local/share/ca-certificates/caido-ca.crt"
+  echo "Downloading certificate to $CA_CERT_PATH..."
+  sudo curl -s http://localhost:$CAIDO_PORT/ca.crt -o "$CA_CERT_PATH"
+  # 将Caido证书添加到NSS数据库(浏览器等)
+  rm -rf ~/.pki/nssdb
+  mkdir -p ~/.pki/nssdb
+  certutil -N -d sql:$HOME/.pki/nssdb --empty-password
+  certutil -A -n "Testing Root CA" -t "C,," -i $CA_CERT_PATH -d sql:$HOME/.pki/nssdb
+}
 
-# 启动code-server
-if [ -z "${NO_CODESERVER}" ]; then
-  code-server --disable-workspace-trust --bind-addr 0.0.0.0:${CODE_PORT} --auth none ~/Workspace >/dev/null 2>&1 &
-  while ! curl -s --head http://localhost:$CODE_PORT/ >/dev/null; do
-    sleep 1
-  done
+setup_caido_project() {
+  # 获取Caido Token
+  export CAIDO_TOKEN=$(curl -s -X POST \
+    -H "Content-Type: application/json" \
+    -d '{"query":"mutation LoginAsGuest { loginAsGuest { token { accessToken } } }"}' \
+    http://localhost:$CAIDO_PORT/graphql | jq -r '.data.loginAsGuest.token.accessToken')
+  if [ -z "$CAIDO_TOKEN" ] || [ "$CAIDO_TOKEN" == "null" ]; then
+    echo "Failed to get API token from Caido."
+    exit 1
+  fi
+  # 快速路径: 直接选择镜像里预先创建的项目
+  if [ -n "${BAKED_PROJECT_ID}" ] && select_caido_project $BAKED_PROJECT_ID; then
+    return
+  fi
+  # 创建和选择Caido项目
+  CREATE_PROJECT_RESPONSE=$(curl -s -X POST \
+    -H "Content-Type: application/json" \
+    -H "Authorization: Bearer $CAIDO_TOKEN" \
+    -d '{"query":"mutation CreateProject { createProject(input: {name: \"sandbox\", temporary: true}) { project { id } } }"}' \
+    http://localhost:$CAIDO_PORT/graphql)
+  PROJECT_ID=$(echo $CREATE_PROJECT_RESPONSE | jq -r '.data.createProject.project.id')
+  # 选择失败不中断启动 (set -e), 与之前一样继续
+  select_caido_project $PROJECT_ID || echo "warning: could not select Caido project '$PROJECT_ID', continuing"
+}
 
+select_caido_project() {
+  echo "Selecting Caido project..."
+  local selected=$(curl -s -X POST \
+    -H "Content-Type: application/json" \
+    -H "Authorization: Bearer $CAIDO_TOKEN" \
+    -d '{"query":"mutation SelectProject { selectProject(id: \"'$1'\") { currentProject { project { id } } } }"}' \
+    http://localhost:$CAIDO_PORT/graphql | jq -r '.data.selectProject.currentProject.project.id')
+  echo "$selected"
+  [ "$selected" == "$1" ]
+}
+
+start_code_server() {
+  code-server --disable-workspace-trust --bind-addr 0.0.0.0:${CODE_PORT} --auth none ~/Workspace >/dev/null 2>&1 &
+  wait_for 120 http_ok http://localhost:$CODE_PORT/
   # 启动浏览器显示code-server
   if [ -z "${NO_VISION}" ]; then
+    wait_for 60 vnc_ready
     chrome --no-sandbox --app=http://localhost:$CODE_PORT/ --user-data-dir="$HOME/.config/chromium-code" --test-type --window-position=100,100 --window-size=1200,800 >/dev/null 2>&1 &
   fi
+}
+
+start_playwright() {
+  # 有界面时需要VNC的DISPLAY; 代理走Caido, 证书已在NSS数据库中
+  wait_for 60 vnc_ready
+  python3 /opt/service/browser.py --port $BROWSER_PORT >/dev/null 2>&1 &
+  wait_for 60 port_open $BROWSER_PORT
+}
+
+write_boot_timings() {
+  mkdir -p ~/Workspace/logs
+  python3 - "$BOOT_TIMINGS" "$BOOT_START" $EPOCHREALTIME ~/Workspace/logs/boot_timings.json <<'PY'
+import json, sys
+timings, boot_start, boot_end, out = sys.argv[1], float(sys.argv[2]), float(sys.argv[3]), sys.argv[4]
+phases = []
+for line in open(timings):
+    name, start, end = line.split()
+    phases.append({"phase": name, "start": round(float(start) - boot_start, 3), "duration": round(float(end) - float(start), 3)})
+phases.sort(key=lambda p: p["start"])
+json.dump({"total": round(boot_end - boot_start, 3), "phases": phases}, open(out, "w"), indent=2)
+PY
+}
+
+# 相互独立的服务并行启动, 只有依赖关系需要等待:
+#   VNC、code-server 与 Caido 并行; Playwright 需要Caido证书; MCP 需要 CAIDO_TOKEN
+BOOT_JOBS=()
+if [ -z "${NO_VISION}" ]; then
+  phase vnc start_vnc &
+  BOOT_JOBS+=($!)
 fi
+if [ -z "${NO_CODESERVER}" ]; then
+  phase code_server start_code_server &
+  BOOT_JOBS+=($!)
+fi
+
+phase caido start_caido
+if [ -z "${BAKED_PROJECT_ID}" ] || [ ! -f ~/.pki/nssdb/cert9.db ]; then
+  phase caido_ca install_caido_ca
+fi
+phase playwright start_playwright &
+BOOT_JOBS+=($!)
+phase caido_project setup_caido_project
 
-# 启动Playwright浏览器
-python3 /opt/service/browser.py --port $BROWSER_PORT >/dev/null 2>&1 &
+# 启动浏览器显示Caido
+if [ -z "${NO_VISION}" ]; then
+  (wait_for 60 vnc_ready && chrome --no-sandbox --app=http://localhost:$CAIDO_PORT/ --user-data-dir="$HOME/.config/chromium-caido" --test-type --window-position=200,200 --window-size=1200,800 >/dev/null 2>&1) &
+fi
 
 # 启动Python Executor MCP
-python3 /opt/service/python_executor_mcp.py --port $MCP_PORT
+MCP_START=$EPOCHREALTIME
+python3 /opt/service/python_executor_mcp.py --port $MCP_PORT &
+MCP_PID=$!
+wait_for 120 http_ok http://localhost:$MCP_PORT/ && echo "mcp $MCP_START $EPOCHREALTIME" >>$BOOT_TIMINGS
+wait "${BOOT_JOBS[@]}" || true
+write_boot_timings || true
+wait $MCP_PID
@@ -0,0 +1,87 @@
+import psutil
+
+
+def _peak_rss(proc):
+    """High-water mark of the process RSS in bytes (VmHWM), falling back to the current RSS."""
+    try:
+        with open(f"/proc/{proc.pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return proc.memory_info().rss
+
+
+def kernel_usage(pid):
+    """
+    (cpu_seconds, peak_rss_bytes) of a kernel process. CPU time includes reaped and still
+    running child processes, so `!cmd` and subprocess calls are charged to the cell.
+    """
+    if not pid:
+        return 0.0, 0
+    try:
+        proc = psutil.Process(pid)
+        times = proc.cpu_times()
+        cpu = times.user + times.system + times.children_user + times.children_system
+        for child in proc.children(recursive=True):
+            try:
+                child_times = child.cpu_times()
+                cpu += child_times.user + child_times.system
+            except psutil.Error:
+                continue
+        return cpu, _peak_rss(proc)
+    except psutil.Error:
+        return 0.0, 0
+
+
+class SessionStats:
+    """Running totals of the execution_stats of one session's cells."""
+
+    def __init__(self):
+        self.executions = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.wall_time = 0.0
+        self.max_wall_time = 0.0
+        self.cpu_time = 0.0
+        self.first_output_times = []
+        self.peak_rss_delta = 0
+        self.output_bytes = 0
+        self.returned_bytes = 0
+        self.slowest = None
+        self.last = None
+
+    def add(self, stats, code):
+        self.executions += 1
+        self.errors += stats['status'] in ('error', 'died')
+        self.timeouts += stats['status'] == 'timeout'
+        self.wall_time += stats['wall_time']
+        self.cpu_time += stats['cpu_time']
+        self.peak_rss_delta += stats['peak_rss_delta']
+        self.output_bytes += stats['output_bytes']
+        self.returned_bytes += stats['returned_bytes']
+        if stats['time_to_first_output'] is not None:
+            self.first_output_times.append(stats['time_to_first_output'])
+        if stats['wall_time'] >= self.max_wall_time:
+            self.max_wall_time = stats['wall_time']
+            self.slowest = {"execution_count": stats['execution_count'], "wall_time": stats['wall_time'],
+                            "code": code[:200]}
+        self.last = stats
+
+    def summary(self):
+        firsts = self.first_output_times
+        return {
+            "executions": self.executions,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "wall_time_total": round(self.wall_time, 3),
+            "wall_time_mean": round(self.wall_time / self.executions, 3) if self.executions else 0.0,
+            "wall_time_max": round(self.max_wall_time, 3),
+            "time_to_first_output_mean": round(sum(firsts) / len(firsts), 3) if firsts else None,
+            "cpu_time_total": round(self.cpu_time, 3),
+            "peak_rss_growth": self.peak_rss_delta,
+            "output_bytes_total": self.output_bytes,
+            "returned_bytes_total": self.returned_bytes,
+            "slowest": self.slowest,
+        }
@@ -0,0 +1,103 @@
+import asyncio
+from collections import deque
+from queue import Empty
+from jupyter_client import AsyncKernelManager
+
+
+class KernelPool:
+    """
+    Keep `size` idle Jupyter kernels started in the background, with `warmup_code`
+    (by default `import toolset`) already executed, and hand them out to new sessions.
+    Every acquire() triggers an asynchronous top-up; if the pool is empty a kernel is
+    started on the spot, which is exactly the old cold-start path.
+
+    All methods run on the server's event loop, so no locking is needed.
+    """
+
+    def __init__(self, size=2, warmup_code="import toolset", kernel_name='python3', ready_timeout=30):
+        self.size = size
+        self.warmup_code = warmup_code
+        self.kernel_name = kernel_name
+        self.ready_timeout = ready_timeout
+        self._idle = deque()
+        self._starting = 0
+        self._closed = False
+        self._tasks = set()
+
+    async def _start_kernel(self, ready_timeout, warmup=True):
+        km = AsyncKernelManager(kernel_name=self.kernel_name)
+        await km.start_kernel()
+        client = km.client()
+        client.start_channels()
+        try:
+            await client.wait_for_ready(timeout=ready_timeout)
+            if warmup and self.warmup_code:
+                await self.run_silent(client, self.warmup_code, ready_timeout)
+        except (RuntimeError, TimeoutError):
+            await self.stop_kernel(km, client)
+            raise RuntimeError("Kernel did not start in time.")
+        return km, client
+
+    async def run_silent(self, client, code, timeout):
+        """Execute `code` without touching In[]/Out[] and return the shell reply."""
+        msg_id = client.execute(code, silent=True, store_history=False)
+        deadline = asyncio.get_running_loop().time() + timeout
+        while True:
+            remaining = deadline - asyncio.get_running_loop().time()
+            try:
+                reply = await client.get_shell_msg(timeout=max(remaining, 0))
+            except Empty:
+                raise TimeoutError(f"Silent execution did not finish within {timeout}s")
+            if reply['parent_header'].get('msg_id') == msg_id:
+                return reply
+
+    async def _fill(self):
+        while not self._closed and len(self._idle) + self._starting < self.size:
+            self._starting += 1
+            try:
+                kernel = await self._start_kernel(self.ready_timeout)
+            except Exception:
+                return  # don't spin on a broken environment, next acquire() retries
+            finally:
+                self._starting -= 1
+            if self._closed:
+                await self.stop_kernel(*kernel)
+                return
+            self._idle.append(kernel)
+
+    def refill(self):
+        """Top the pool back up to `size` in a background task."""
+        if self.size <= 0 or self._closed:
+            return
+        task = asyncio.get_running_loop().create_task(self._fill())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def acquire(self, cold_timeout=3):
+        """Return (AsyncKernelManager, client) for a new session, preferring a warm kernel."""
+        kernel = None
+        while self._idle:
+            km, client = self._idle.popleft()
+            if await km.is_alive():
+                kernel = (km, client)
+                break
+            await self.stop_kernel(km, client)
+        self.refill()
+        if kernel is None:
+            kernel = await self._start_kernel(cold_timeout, warmup=False)
+        return kernel
+
+    async def stop_kernel(self, km, client):
+        try:
+            client.stop_channels()
+            await km.shutdown_kernel(now=True)
+        except Exception:
+            pass
+
+    def idle_count(self):
+        return len(self._idle)
+
+    async def shutdown(self):
+        self._closed = True
+        idle, self._idle = list(self._idle), deque()
+        await asyncio.gather(*(self.stop_kernel(km, client) for km, client in idle))
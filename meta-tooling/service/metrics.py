@@ -0,0 +1,138 @@
+import glob
+import json
+import os
+
+# same bounds as core.metrics, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOOLSET_METRICS_DIR = os.getenv("TOOLSET_METRICS_DIR", "/tmp/toolset_metrics")
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    escape = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    pairs = ",".join(f'{n}="{escape(v)}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        return self.header() + [f"{self.name}{_labels(self.labelnames, k)} {_number(v)}" for k, v in self.values.items()]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, *labels):
+        self.values[labels] = value
+
+    def inc(self, *labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    render = Counter.render
+
+
+class Histogram(_Metric):
+    """Values are [per-bucket counts (non cumulative, +Inf last), sum]."""
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        counts, total = self.values.get(labels) or ([0] * (len(self.buckets) + 1), 0.0)
+        index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        counts[index] += 1
+        self.values[labels] = (counts, total + value)
+
+    def render(self):
+        lines = self.header()
+        for labels, (counts, total) in self.values.items():
+            cumulative = 0
+            for bound, count in zip([*self.buckets, "+Inf"], counts):
+                cumulative += count
+                le = bound if bound == "+Inf" else _number(float(bound))
+                lines.append(f"{self.name}_bucket{_labels((*self.labelnames, 'le'), (*labels, le))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(float(total))}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """A tiny Prometheus text-format registry; everything runs on the server's event loop."""
+
+    def __init__(self):
+        self.metrics = []
+
+    def _add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._add(Counter(name, help_text, labelnames))
+
+    def gauge(self, name, help_text, labelnames=()):
+        return self._add(Gauge(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help_text, labelnames, buckets))
+
+    def render(self, extra=()):
+        lines = []
+        for metric in [*self.metrics, *extra]:
+            if metric.values:
+                lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def toolset_metrics(directory=TOOLSET_METRICS_DIR):
+    """
+    Sum the per-process snapshots written by core.metrics (kernels, init script, ...) into
+    toolset_calls_total / toolset_errors_total / toolset_call_duration_seconds.
+    """
+    calls = Counter("toolset_calls_total", "Toolset tool calls, across all processes", ("tool",))
+    errors = Counter("toolset_errors_total", "Toolset tool calls that raised", ("tool",))
+    duration = Histogram("toolset_call_duration_seconds", "Toolset tool call latency", ("tool",))
+    for path in glob.glob(os.path.join(directory, "*.json")):
+        try:
+            with open(path) as f:
+                snapshot = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            continue
+        if tuple(snapshot.get("buckets", ())) != duration.buckets:
+            continue
+        for tool, entry in snapshot.get("tools", {}).items():
+            calls.inc(tool, amount=entry["calls"])
+            errors.inc(tool, amount=entry["errors"])
+            counts, total = duration.values.get((tool,)) or ([0] * (len(duration.buckets) + 1), 0.0)
+            for i, count in enumerate(entry["buckets"]):
+                counts[i] += count
+            counts[-1] += entry["calls"] - sum(entry["buckets"])  # above the largest bound
+            duration.values[(tool,)] = (counts, total + entry["sum"])
+    return [calls, errors, duration]
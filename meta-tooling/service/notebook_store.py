@@ -0,0 +1,140 @@
+import asyncio
+import glob
+import json
+import os
+import time
+import nbformat
+from nbformat import v4 as nbf
+
+
+JOURNAL_SUFFIX = ".journal"
+
+
+def _write_text_atomic(text, filepath):
+    tmp_path = filepath + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, filepath)
+
+
+def _write_atomic(notebook, filepath):
+    _write_text_atomic(nbformat.writes(notebook), filepath)
+
+
+def recover_notebook(filepath):
+    """
+    Rebuild a notebook from its last materialized .ipynb plus the cell journal written after it.
+    Journal records are "cell at index i is now X", so replaying ones already in the .ipynb is harmless.
+    """
+    if os.path.exists(filepath):
+        with open(filepath, encoding='utf-8') as f:
+            notebook = nbformat.read(f, as_version=4)
+    else:
+        notebook = nbf.new_notebook()
+    journal_path = filepath + JOURNAL_SUFFIX
+    if os.path.exists(journal_path):
+        with open(journal_path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # torn last line after a crash
+                index, cell = record['index'], nbformat.from_dict(record['cell'])
+                if index < len(notebook.cells):
+                    notebook.cells[index] = cell
+                else:
+                    notebook.cells.append(cell)
+    return notebook
+
+
+def recover_all(path):
+    """Materialize notebooks whose journals were left behind by a crashed server."""
+    for journal_path in glob.glob(os.path.join(path, f"*.ipynb{JOURNAL_SUFFIX}")):
+        filepath = journal_path[:-len(JOURNAL_SUFFIX)]
+        try:
+            _write_atomic(recover_notebook(filepath), filepath)
+            os.remove(journal_path)
+        except Exception:
+            continue
+
+
+class NotebookStore:
+    """
+    Incremental persistence for a session notebook.
+
+    Every cell change is appended to <notebook>.ipynb.journal as one JSON line, so the
+    per-cell cost only depends on that cell. The full .ipynb is re-materialized in a
+    worker thread at most every `interval` seconds and on close(), after which the
+    journal is truncated. Until then recover_notebook() reconstructs the latest state.
+    """
+
+    def __init__(self, filepath, interval=10.0):
+        self.filepath = filepath
+        self.journal_path = filepath + JOURNAL_SUFFIX
+        self.interval = interval
+        self.notebook = nbf.new_notebook()
+        self._journal = open(self.journal_path, 'a', encoding='utf-8')
+        self._last_materialized = 0.0
+        self._task = None
+        self._wake = asyncio.Event()
+        self._write_lock = asyncio.Lock()
+        # write the empty notebook right away so the filename is taken on disk
+        _write_atomic(self.notebook, self.filepath)
+
+    def _append(self, index, cell):
+        self._journal.write(json.dumps({"index": index, "cell": cell}, ensure_ascii=False) + "\n")
+        self._journal.flush()
+        self._schedule()
+
+    def add_cell(self, cell):
+        self.notebook.cells.append(cell)
+        self._append(len(self.notebook.cells) - 1, cell)
+
+    def update_cell(self, cell):
+        # identity search from the end: the updated cell is almost always the last one
+        cells = self.notebook.cells
+        index = next(i for i in range(len(cells) - 1, -1, -1) if cells[i] is cell)
+        self._append(index, cell)
+
+    def _schedule(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._materialize_later())
+
+    async def _materialize_later(self):
+        delay = self._last_materialized + self.interval - time.monotonic()
+        if delay > 0:
+            try:
+                await asyncio.wait_for(self._wake.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+        await self.materialize()
+
+    async def materialize(self):
+        async with self._write_lock:
+            # serialized here on the loop: cells keep changing while a thread would walk them
+            # (execution_stats metadata, outputs of running jobs), only the write is offloaded
+            text = nbformat.writes(self.notebook)
+            journal_size = self._journal.tell()
+            await asyncio.to_thread(_write_text_atomic, text, self.filepath)
+            self._last_materialized = time.monotonic()
+            if self._journal.tell() == journal_size:
+                # nothing was appended meanwhile, the .ipynb now holds everything in the journal
+                self._journal.truncate(0)
+                self._journal.seek(0)
+
+    async def close(self):
+        # wake a pending debounce instead of cancelling it mid-write
+        self._wake.set()
+        if self._task is not None:
+            try:
+                await self._task
+            except Exception:
+                pass  # a failed background write, retried right below
+        try:
+            await self.materialize()
+        except Exception:
+            # keep the journal, recover_all() rebuilds the notebook from it on the next start
+            self._journal.close()
+            return
+        self._journal.close()
+        os.remove(self.journal_path)
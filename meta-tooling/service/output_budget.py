@@ -0,0 +1,86 @@
+import json
+import re
+
+ANSI_RE = re.compile(r'\x1b\[[0-?]*[ -/]*[@-~]|\x1b\][^\x07]*\x07')
+
+
+def strip_ansi(text):
+    return ANSI_RE.sub('', text)
+
+
+def _payload(item):
+    """Text that counts against the budget for one formatted output."""
+    if item['type'] == 'stream':
+        return item['text']
+    if item['type'] == 'error':
+        return '\n'.join(item['traceback']) or f"{item['ename']}: {item['evalue']}"
+    if 'data' in item:
+        data = item['data']
+        if list(data) == ['text/plain']:
+            return data['text/plain']
+        return json.dumps(data, ensure_ascii=False)
+    return json.dumps(item, ensure_ascii=False)
+
+
+def _with_payload(item, text):
+    item = dict(item)
+    if item['type'] == 'stream':
+        item['text'] = text
+    elif item['type'] == 'error':
+        item['traceback'] = text.split('\n')
+    elif 'data' in item:
+        # rich mime bundles (html, images) can't be cut meaningfully, keep the text view only
+        item['data'] = {'text/plain': text}
+    return item
+
+
+def clean_outputs(outputs):
+    """Strip ANSI escapes and merge consecutive stream chunks of the same stream."""
+    cleaned = []
+    for item in outputs:
+        item = dict(item)
+        if item['type'] == 'stream':
+            item['text'] = strip_ansi(item['text'])
+            prev = cleaned[-1] if cleaned else None
+            if prev and prev['type'] == 'stream' and prev['name'] == item['name']:
+                prev['text'] += item['text']
+                continue
+        elif item['type'] == 'error':
+            item['traceback'] = [strip_ansi(line) for line in item['traceback']]
+            item['evalue'] = strip_ansi(item['evalue'])
+        cleaned.append(item)
+    return cleaned
+
+
+def render_outputs(outputs):
+    """Plain-text rendering of all outputs, used for the spill file."""
+    return '\n'.join(_payload(item) for item in outputs)
+
+
+def apply_budget(outputs, max_chars):
+    """
+    Keep at most `max_chars` characters of output: the first half and the last half
+    of the concatenated payloads, so both the start of a dump and a trailing traceback
+    survive. Returns (outputs, omitted_chars).
+    """
+    payloads = [_payload(item) for item in outputs]
+    total = sum(len(p) for p in payloads)
+    if max_chars is None or max_chars <= 0 or total <= max_chars:
+        return outputs, 0
+
+    head_end = max_chars // 2
+    tail_start = total - (max_chars - head_end)
+    budgeted = []
+    offset = 0
+    for item, payload in zip(outputs, payloads):
+        start, end = offset, offset + len(payload)
+        offset = end
+        head = payload[:max(0, min(end, head_end) - start)]
+        tail = payload[len(payload) - max(0, end - max(start, tail_start)):] if end > tail_start else ''
+        if len(head) + len(tail) >= len(payload):
+            budgeted.append(item)
+        elif head or tail:
+            cut = len(payload) - len(head) - len(tail)
+            marker = f"[... {cut} chars truncated ...]"
+            budgeted.append(_with_payload(item, '\n'.join(p for p in (head, marker, tail) if p)))
+    return budgeted, total - max_chars
@@ -1,13 +1,25 @@
+import asyncio
 import time
 import os
 import re
+import json
+import uuid
 import argparse
+from collections import deque
+from contextlib import asynccontextmanager
 from typing import Annotated, Optional
 from queue import Empty
-import nbformat
-from jupyter_client import KernelManager
+import psutil
 from nbformat import v4 as nbf
 from fastmcp import FastMCP
+from fastmcp.server.middleware import Middleware
+from starlette.responses import PlainTextResponse
+from pydantic import BaseModel, Field
+from kernel_pool import KernelPool
+from notebook_store import NotebookStore, recover_all
+from output_budget import apply_budget, clean_outputs, render_outputs
+from exec_stats import SessionStats, kernel_usage
+from metrics import MetricsRegistry, toolset_metrics
 
 # toolset is available inside the sandbox; logger integration
 try:
@@ -15,11 +27,116 @@ try:
 except Exception:  # pragma: no cover - defensive import
     toolset = None
 
+DEFAULT_OUTPUT_BUDGET = int(os.getenv("OUTPUT_BUDGET", "20000"))
+
+METRICS = MetricsRegistry()
+MCP_CALLS = METRICS.counter("mcp_tool_calls_total", "MCP tool calls", ("tool",))
+MCP_ERRORS = METRICS.counter("mcp_tool_errors_total", "MCP tool calls that failed", ("tool",))
+MCP_DURATION = METRICS.histogram("mcp_tool_duration_seconds", "MCP tool call latency", ("tool",))
+MCP_IN_FLIGHT = METRICS.gauge("mcp_tool_calls_in_flight", "MCP tool calls running or waiting for a session", ("tool",))
+CELLS = METRICS.counter("executor_cells_total", "Executed cells by outcome", ("status",))
+CELL_DURATION = METRICS.histogram("executor_cell_duration_seconds", "Cell wall time", ("status",))
+SESSION_EVENTS = METRICS.counter("executor_session_events_total", "Session evictions and kernel recycles", ("event",))
+LIVE_KERNELS = METRICS.gauge("executor_live_kernels", "Kernels attached to a session")
+BUSY_SESSIONS = METRICS.gauge("executor_busy_sessions", "Sessions currently executing code")
+IDLE_POOL_KERNELS = METRICS.gauge("executor_pool_idle_kernels", "Warm kernels waiting in the pool")
+RUNNING_JOBS = METRICS.gauge("executor_running_jobs", "Background jobs still running")
+LOGGER_QUEUE_DEPTH = METRICS.gauge("logger_queue_depth", "Records waiting in the logger's group-commit queue")
+LOGGER_WRITE_ERRORS = METRICS.gauge("logger_write_errors", "Failed journal writes of the logger")
+
+# Runs silently in the source kernel of fork_session. Variables are pickled together (so shared
+# references survive) and one by one (so a single bad value doesn't sink the rest); modules are
+# re-imported by name. cloudpickle/dill are preferred because they handle functions and classes
+# defined in the notebook.
+FORK_DUMP_CODE = """
+def __fork_dump(path):
+    import json, os, pickle, types
+    try:
+        import cloudpickle as p
+    except ImportError:
+        try:
+            import dill as p
+        except ImportError:
+            p = pickle
+    shell = get_ipython()
+    items, modules, skipped = {}, {}, {}
+    for name, value in list(shell.user_ns.items()):
+        if name.startswith('_') or name in shell.user_ns_hidden:
+            continue
+        if isinstance(value, types.ModuleType):
+            modules[name] = value.__name__
+            continue
+        try:
+            items[name] = p.dumps(value)
+        except Exception as e:
+            skipped[name] = f"{type(e).__name__}: {e}"[:200]
+    try:
+        combined = p.dumps({name: shell.user_ns[name] for name in items})
+    except Exception:
+        combined = None
+    with open(path, 'wb') as f:
+        pickle.dump({'combined': combined, 'items': items, 'modules': modules, 'cwd': os.getcwd()}, f)
+    with open(path + '.dump.json', 'w') as f:
+        json.dump({'transferred': sorted(items), 'modules': modules, 'skipped': skipped}, f)
+__fork_dump(%r)
+del __fork_dump
+"""
+
+FORK_LOAD_CODE = """
+def __fork_load(path):
+    import importlib, json, os, pickle
+    with open(path, 'rb') as f:
+        payload = pickle.load(f)
+    ns = get_ipython().user_ns
+    loaded, failed = [], {}
+    for name, module in payload['modules'].items():
+        try:
+            ns[name] = importlib.import_module(module)
+            loaded.append(name)
+        except Exception as e:
+            failed[name] = f"{type(e).__name__}: {e}"[:200]
+    values = None
+    if payload['combined'] is not None:
+        try:
+            values = pickle.loads(payload['combined'])
+        except Exception:
+            values = None
+    if values is None:
+        values = {}
+        for name, data in payload['items'].items():
+            try:
+                values[name] = pickle.loads(data)
+            except Exception as e:
+                failed[name] = f"{type(e).__name__}: {e}"[:200]
+    ns.update(values)
+    loaded.extend(values)
+    try:
+        os.chdir(payload['cwd'])
+    except OSError:
+        pass
+    with open(path + '.load.json', 'w') as f:
+        json.dump({'loaded': sorted(loaded), 'failed': failed}, f)
+__fork_load(%r)
+del __fork_load
+"""
+
 class PythonExecutor:
-    def __init__(self, path="scripts"):
+    def __init__(self, path="scripts", pool_size=0, max_sessions=8, idle_timeout=1800, max_rss_mb=2048):
         self.path = path
+        self.output_path = os.path.join(path, "outputs")  # spilled full outputs of truncated cells
         self.sessions = {}
+        self.session_locks = {}  # per-session serialization; different sessions run concurrently
+        self.pool = KernelPool(size=pool_size)
+        # lifecycle limits, 0 disables each of them
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.max_rss_mb = max_rss_mb
+        self.events = deque(maxlen=200)  # evictions/recycles, see session_events()
+        self.pending_notices = {}  # session name -> notices for its next execute_code result
+        self.jobs = {}  # job id -> background execution started by submit_code
+        self.job_counter = 0
         os.makedirs(self.path, exist_ok=True)
+        recover_all(self.path)
 
     def _sanitize_filename(self, name):
         name = re.sub(r'[^\w\-.]', '_', name)
@@ -37,29 +154,108 @@ class PythonExecutor:
                 return new_path
             i += 1
 
-    def _create_session(self, session_name):
-        km = KernelManager(kernel_name='python3')
-        km.start_kernel()
-        client = km.client()
-        client.start_channels()
-        try:
-            client.wait_for_ready(timeout=3)
-        except RuntimeError:
-            client.stop_channels()
-            km.shutdown_kernel(now=True)
-            raise RuntimeError("Kernel did not start in time.")
+    def _notebook_name(self, session):
+        # unique per session incarnation, unlike the name: an evicted or closed session starts
+        # over at execution_count 1 in a new notebook, and must not overwrite earlier spill files
+        return os.path.splitext(os.path.basename(session['filepath']))[0]
+
+    def _session_lock(self, session_name):
+        if session_name not in self.session_locks:
+            self.session_locks[session_name] = asyncio.Lock()
+        return self.session_locks[session_name]
+
+    async def _create_session(self, session_name):
+        # warm kernel from the pool if one is idle, otherwise a cold start (3s readiness limit)
+        km, client = await self.pool.acquire(cold_timeout=3)
 
         filepath = self._get_unique_filepath(session_name)
-        notebook = nbf.new_notebook()
+        store = NotebookStore(filepath)
 
         self.sessions[session_name] = {
             'km': km,
             'client': client,
-            'notebook': notebook,
+            'store': store,
+            'notebook': store.notebook,
             'filepath': filepath,
-            'execution_count': 1
+            'execution_count': 1,
+            'last_used': time.monotonic(),
+            'stats': SessionStats()
         }
         return self.sessions[session_name]
+
+    # ---- lifecycle: LRU cap, idle eviction, memory ceiling ----
+    def _record_event(self, session_name, event, reason):
+        entry = {"time": time.time(), "session": session_name, "event": event, "reason": reason}
+        SESSION_EVENTS.inc(event)
+        self.events.append(entry)
+        self.pending_notices.setdefault(session_name, []).append(
+            f"[SYSTEM] Session '{session_name}' was {event}: {reason}. Variables and imports of that kernel are lost.")
+        return entry
+
+    def _take_notices(self, session_name):
+        return [{"type": "display_data", "data": {"text/plain": text}}
+                for text in self.pending_notices.pop(session_name, [])]
+
+    def _kernel_rss(self, km):
+        """RSS in bytes of the kernel process and its children (e.g. `!cmd` subprocesses)."""
+        pid = getattr(km.provisioner, 'pid', None)
+        if not pid:
+            return 0
+        try:
+            proc = psutil.Process(pid)
+            return sum(p.memory_info().rss for p in [proc, *proc.children(recursive=True)])
+        except psutil.Error:
+            return 0
+
+    async def _evict(self, session_name, reason):
+        if await self.close_session(session_name):
+            self._record_event(session_name, "evicted", reason)
+
+    async def _enforce_capacity(self):
+        """Evict least recently used idle sessions so a new one fits under max_sessions."""
+        if not self.max_sessions:
+            return
+        while len(self.sessions) >= self.max_sessions:
+            idle = [(s['last_used'], name) for name, s in self.sessions.items()
+                    if not self._session_lock(name).locked()]
+            if not idle:
+                return  # every session is busy, allow going over the cap rather than failing
+            _, victim = min(idle)
+            await self._evict(victim, f"live kernel limit ({self.max_sessions}) reached, least recently used")
+
+    async def _recycle_if_oversized(self, session_name, session):
+        """Restart the kernel when it exceeds max_rss_mb; the caller must hold the session lock."""
+        if not self.max_rss_mb:
+            return False
+        rss_mb = self._kernel_rss(session['km']) / (1 << 20)
+        if rss_mb <= self.max_rss_mb:
+            return False
+        await session['km'].restart_kernel(now=True)
+        await session['client'].wait_for_ready(timeout=30)
+        self._record_event(session_name, "recycled", f"kernel memory {rss_mb:.0f} MB exceeded {self.max_rss_mb} MB")
+        return True
+
+    async def sweep(self):
+        """Evict sessions idle for longer than idle_timeout and recycle idle oversized kernels."""
+        now = time.monotonic()
+        for name, session in list(self.sessions.items()):
+            lock = self._session_lock(name)
+            if lock.locked():
+                continue
+            if self.idle_timeout and now - session['last_used'] > self.idle_timeout:
+                await self._evict(name, f"idle for more than {self.idle_timeout}s")
+                continue
+            async with lock:
+                if self.sessions.get(name) is session:
+                    await self._recycle_if_oversized(name, session)
+
+    async def run_sweeper(self, interval=60):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.sweep()
+            except Exception:
+                pass
     
     def _format_output(self, output_objects):
         formatted_outputs = []
@@ -91,99 +287,115 @@ class PythonExecutor:
                 })   
         return formatted_outputs
 
+    def _budget_output(self, spill_name, formatted, max_chars):
+        """
+        Strip ANSI codes, merge stream chunks and cut the response down to `max_chars`
+        (head + tail). The complete cleaned output is spilled to a file whose path is returned
+        to the agent in a [SYSTEM] message.
+        """
+        cleaned = clean_outputs(formatted)
+        budgeted, omitted = apply_budget(cleaned, max_chars)
+        if not omitted:
+            return budgeted
+        os.makedirs(self.output_path, exist_ok=True)
+        spill_path = os.path.abspath(os.path.join(
+            self.output_path, f"{self._sanitize_filename(spill_name)}.txt"))
+        with open(spill_path, 'w', encoding='utf-8') as f:
+            f.write(render_outputs(cleaned))
+        budgeted.append({
+            "type": "display_data",
+            "data": {"text/plain": f"[SYSTEM] Output truncated, {omitted} chars omitted. Full output saved to {spill_path}"}
+        })
+        return budgeted
+
+    def _log_code(self, code):
+        if toolset is None or getattr(toolset, 'logger', None) is None:
+            return
+        try:
+            toolset.logger.log_code(code)
+        except Exception:
+            pass  # Don't break execution if logging fails
+
+    def _log_observations(self, formatted):
+        if toolset is None or getattr(toolset, 'logger', None) is None:
+            return
+        for item in formatted:
+            try:
+                obs_type = "error" if item.get("type") == "error" else "code_output"
+                # Optional planning extraction
+                if item.get("type") == "stream" and isinstance(item.get("text"), str):
+                    text = item["text"].lstrip()
+                    if text.lower().startswith(("plan:", "planning:")):
+                        toolset.logger.log_planning_step(text)
+                toolset.logger.log_observation(item, obs_type)
+            except Exception:
+                pass  # Don't break execution if logging fails
+
     def list_sessions(self):
         return list(self.sessions.keys())
 
-    def execute_code(self, session_name, code, timeout=10):
-        if session_name not in self.sessions:
-            self._create_session(session_name)
-        
-        session = self.sessions[session_name]        
+    async def execute_code(self, session_name, code, timeout=10, max_output_chars=DEFAULT_OUTPUT_BUDGET):
+        job = self._running_job(session_name)
+        if job:
+            # waiting for the lock would block this call until the job ends
+            return [{"type": "display_data", "data": {"text/plain":
+                f"[SYSTEM] Session '{session_name}' is busy with background job {job['job_id']}. "
+                f"Use poll_job/cancel_job, or run this code in another session."}}]
+        async with self._session_lock(session_name):
+            if session_name not in self.sessions:
+                await self._enforce_capacity()
+                await self._create_session(session_name)
+            session = self.sessions[session_name]
+            formatted = await self._execute(session_name, session, code, timeout, max_output_chars)
+            session['last_used'] = time.monotonic()
+            await self._recycle_if_oversized(session_name, session)
+            return self._take_notices(session_name) + formatted
+
+    async def _execute(self, session_name, session, code, timeout, max_output_chars, output_objects=None):
+        """
+        Run one cell. `timeout` None waits for completion without limit; outputs are
+        appended to `output_objects` as they arrive, so a caller can watch it grow.
+        """
         client = session['client']
         km = session['km']
-        notebook = session['notebook']
-        filepath = session['filepath']
+        store = session['store']
         exec_count = session['execution_count']
 
-        # Inject logging code that runs inside the container's Python environment
-        # This code will execute in the Jupyter kernel, where toolset is available
-        import json
-        code_escaped = json.dumps(code)
-        log_code_injection = f"""
-# Auto-injected logging code (runs in container's Python environment)
-try:
-    import toolset
-    import sys
-    import os
-    import json
-    
-    # Debug: check if logger exists
-    has_logger = hasattr(toolset, 'logger')
-    logger_value = getattr(toolset, 'logger', None)
-    
-    # Write debug info to file
-    debug_path = os.path.join(os.getenv("WORKSPACE_DIR", "/home/ubuntu/Workspace"), ".cursor", "debug.log")
-    os.makedirs(os.path.dirname(debug_path), exist_ok=True)
-    try:
-        with open(debug_path, "a") as f:
-            f.write(json.dumps({{"sessionId":"debug-session","runId":"run1","hypothesisId":"E","location":"python_executor_mcp.py:injection","message":"code injection executed","data":{{"has_logger":has_logger,"logger_type":str(type(logger_value)) if logger_value else "None","logger_is_none":logger_value is None}}}}) + "\\n")
-    except: pass
-    
-    if has_logger and logger_value is not None:
-        code_to_log = json.loads({json.dumps(code_escaped)})
-        toolset.logger.log_code(code_to_log)
-        # Debug: confirm logging succeeded
-        try:
-            with open(debug_path, "a") as f:
-                f.write(json.dumps({{"sessionId":"debug-session","runId":"run1","hypothesisId":"E","location":"python_executor_mcp.py:injection","message":"log_code called","data":{{"code_length":len(code_to_log)}}}}) + "\\n")
-        except: pass
-    else:
-        # Debug: logger not available
-        try:
-            with open(debug_path, "a") as f:
-                f.write(json.dumps({{"sessionId":"debug-session","runId":"run1","hypothesisId":"E","location":"python_executor_mcp.py:injection","message":"logger not available","data":{{"has_logger":has_logger,"logger_value":str(logger_value)}}}}) + "\\n")
-        except: pass
-except Exception as e:
-    # Debug: log exception
-    try:
-        import os, json
-        debug_path = os.path.join(os.getenv("WORKSPACE_DIR", "/home/ubuntu/Workspace"), ".cursor", "debug.log")
-        os.makedirs(os.path.dirname(debug_path), exist_ok=True)
-        with open(debug_path, "a") as f:
-            f.write(json.dumps({{"sessionId":"debug-session","runId":"run1","hypothesisId":"E","location":"python_executor_mcp.py:injection","message":"logging injection failed","data":{{"error":str(e),"error_type":type(e).__name__}}}}) + "\\n")
-    except: pass
-
-"""
-        # Prepend logging injection to user code
-        code_with_logging = log_code_injection + code
+        # hashing/gzip of blobs, socket round trips and the logger's connect retries block,
+        # keep them off the event loop that every session shares
+        await asyncio.to_thread(self._log_code, code)
 
-        cell = nbf.new_code_cell(code_with_logging, execution_count=exec_count)
+        cell = nbf.new_code_cell(code, execution_count=exec_count)
         cell.outputs = []
-        notebook.cells.append(cell)
-        with open(filepath, 'w', encoding='utf-8') as f:
-            nbformat.write(notebook, f)
+        store.add_cell(cell)
+
+        pid = getattr(km.provisioner, 'pid', None)
+        cpu_before, peak_before = kernel_usage(pid)
+        started = time.monotonic()
+        first_output = None
+        timed_out = False
+        died = False
 
-        msg_id = client.execute(code_with_logging)
+        msg_id = client.execute(code)
 
-        output_objects = []
-        start_time = time.time()
+        output_objects = [] if output_objects is None else output_objects
+        deadline = started + timeout if timeout else None
 
         try:
-            shell_reply_received = False
-            
             while True:
-                elapsed = time.time() - start_time
-                
-                if elapsed > timeout:
+                remaining = None if deadline is None else deadline - time.monotonic()
+
+                if remaining is not None and remaining <= 0:
+                    timed_out = True
                     error_msg = f"Execution timeout after {timeout} seconds. Attempting to interrupt..."
                     output_objects.append(nbf.new_output('display_data', data={'text/plain': f'[SYSTEM] {error_msg}'}))
 
                     try:
-                        km.interrupt_kernel()
-                        time.sleep(1)          
+                        await km.interrupt_kernel()
+                        drain_deadline = time.monotonic() + 2
                         try: # 清空剩余消息
                             while True:
-                                msg = client.get_iopub_msg(timeout=0.1)
+                                msg = await client.get_iopub_msg(timeout=max(drain_deadline - time.monotonic(), 0))
                                 if msg['parent_header'].get('msg_id') == msg_id:
                                     msg_type = msg['header']['msg_type']
                                     if msg_type == 'status' and msg['content']['execution_state'] == 'idle':
@@ -200,7 +412,8 @@ except Exception as e:
                     break
                 
                 try:
-                    msg = client.get_iopub_msg(timeout=0.1)
+                    # wakes up as soon as a message arrives; wait at most 1s at a time to check the kernel is alive
+                    msg = await client.get_iopub_msg(timeout=1 if remaining is None else min(remaining, 1))
                     if msg['parent_header'].get('msg_id') != msg_id:
                         continue
 
@@ -209,6 +422,9 @@ except Exception as e:
 
                     if msg_type == 'status' and content['execution_state'] == 'idle':
                         break # 执行完成，退出循环
+
+                    if first_output is None and msg_type in ('stream', 'execute_result', 'display_data', 'error'):
+                        first_output = time.monotonic()
                     
                     if msg_type == 'stream':
                         text = content.get('text', '')
@@ -221,13 +437,11 @@ except Exception as e:
                         output_objects.append(nbf.new_output('error', ename=content.get('ename', ''), evalue=content.get('evalue', ''), traceback=content.get('traceback', [])))
 
                 except Empty:
-                    if not shell_reply_received:
-                        try:
-                            # 尝试获取 shell 消息，如果成功，说明执行结果已返回
-                            client.get_shell_msg(timeout=0.1)
-                            shell_reply_received = True
-                        except Empty:
-                            pass
+                    # a kernel killed by a signal or the OOM killer never reports idle
+                    if not await km.is_alive():
+                        died = True
+                        output_objects.append(nbf.new_output('display_data', data={'text/plain': '[SYSTEM] The kernel died during execution (killed, e.g. out of memory).'}))
+                        break
                     continue
                     
         except Exception as e:
@@ -239,87 +453,351 @@ except Exception as e:
                 )
             )
 
+        if died:
+            try:
+                await km.restart_kernel(now=True)
+                await client.wait_for_ready(timeout=30)
+                self._record_event(session_name, "restarted", "the kernel died during execution")
+            except Exception as e:
+                output_objects.append(nbf.new_output('display_data', data={'text/plain': f'[SYSTEM] Failed to restart the kernel: {repr(e)}'}))
+
+        # 清空 shell 回复, 避免在通道中堆积
+        try:
+            while True:
+                await client.get_shell_msg(timeout=0)
+        except Empty:
+            pass
+
+        wall_time = time.monotonic() - started
+        cpu_after, peak_after = kernel_usage(pid)
+        unbudgeted = self._format_output(output_objects)
+        formatted = self._budget_output(f"{self._notebook_name(session)}_{exec_count}", unbudgeted, max_output_chars)
+        stats = {
+            "execution_count": exec_count,
+            "status": "died" if died else "timeout" if timed_out else "error" if any(o['type'] == 'error' for o in unbudgeted) else "ok",
+            "wall_time": round(wall_time, 3),
+            "time_to_first_output": round(first_output - started, 3) if first_output else None,
+            "cpu_time": round(max(cpu_after - cpu_before, 0.0), 3),
+            "peak_rss_delta": max(peak_after - peak_before, 0),
+            "output_bytes": len(render_outputs(unbudgeted).encode('utf-8')),
+            "returned_bytes": len(render_outputs(formatted).encode('utf-8')),
+        }
+        session['stats'].add(stats, code)
+        CELLS.inc(stats['status'])
+        CELL_DURATION.observe(wall_time, stats['status'])
+
         cell.outputs = output_objects if output_objects else []
-        with open(filepath, 'w', encoding='utf-8') as f:
-            nbformat.write(notebook, f)
+        cell.metadata['execution_stats'] = stats
+        store.update_cell(cell)
 
         session['execution_count'] += 1
 
-        formatted = self._format_output(output_objects)
-
-        # Log observations in the container's Python environment
-        # Inject code that will run after execution to log observations
-        if formatted:
-            try:
-                import json
-                observations_json_str = json.dumps(formatted)
-                # Escape the JSON string for embedding in Python code
-                observations_json_escaped = json.dumps(observations_json_str)
-                
-                log_observations_code = f"""
-# Auto-injected observation logging (runs in container's Python environment)
-try:
-    import toolset
-    import json
-    observations_json = json.loads({observations_json_escaped})
-    observations = json.loads(observations_json)
-    for item in observations:
-        obs_type = "code_output"
-        if item.get("type") == "error":
-            obs_type = "error"
-        
-        # Optional planning extraction
-        if (
-            item.get("type") == "stream"
-            and isinstance(item.get("text"), str)
-        ):
-            text = item["text"].lstrip()
-            if text.lower().startswith(("plan:", "planning:")):
+        # the real observation, not the budgeted excerpt; the logger's blob store takes the size
+        await asyncio.to_thread(self._log_observations, clean_outputs(unbudgeted))
+
+        return formatted + [{"type": "execution_stats", **stats}]
+
+    async def execute_batch(self, entries, max_output_chars=None):
+        """
+        Run (session_name, code, timeout) entries: sequentially within a session, in the
+        given order, and concurrently across sessions. Results keep the input order.
+        """
+        if max_output_chars is None:
+            # keep the whole response around one regular budget
+            max_output_chars = max(DEFAULT_OUTPUT_BUDGET // max(len(entries), 1), 2000)
+        results = [None] * len(entries)
+        groups = {}
+        for i, entry in enumerate(entries):
+            groups.setdefault(entry['session_name'], []).append(i)
+
+        async def run_group(indices):
+            for i in indices:
+                entry = entries[i]
                 try:
-                    if hasattr(toolset, 'logger_tools'):
-                        toolset.logger_tools.log_planning(text)
-                except Exception:
-                    pass
-        
-        # Log observation
-        if hasattr(toolset, 'logger'):
-            toolset.logger.log_observation(item, obs_type)
-except Exception:
-    pass  # Logger not available, continue anyway
-"""
-                # Execute observation logging in the same session (fire and forget)
+                    outputs = await self.execute_code(entry['session_name'], entry['code'],
+                                                      entry.get('timeout') or 10, max_output_chars)
+                except Exception as e:
+                    outputs = [{"type": "display_data", "data": {"text/plain": f"[SYSTEM] Failed to execute code: {repr(e)}"}}]
+                results[i] = {"session_name": entry['session_name'], "outputs": outputs}
+
+        await asyncio.gather(*(run_group(indices) for indices in groups.values()))
+        return results
+
+    async def _run_fork_step(self, client, code, path, report_suffix, timeout):
+        reply = await self.pool.run_silent(client, code % path, timeout)
+        if reply['content'].get('status') != 'ok':
+            content = reply['content']
+            raise RuntimeError(f"{content.get('ename', 'Error')}: {content.get('evalue', '')}")
+        with open(path + report_suffix, encoding='utf-8') as f:
+            return json.load(f)
+
+    async def fork_session(self, src, dst, timeout=60):
+        """
+        Start session `dst` with a copy of the picklable namespace of live session `src`.
+        Reports which variables were transferred and which could not be, with the reason.
+        """
+        if src not in self.sessions:
+            return {"error": f"Session '{src}' does not exist. Active sessions: {', '.join(self.sessions) or 'none'}"}
+        if dst in self.sessions:
+            return {"error": f"Session '{dst}' already exists, close it first or pick another name"}
+        if self._running_job(src):
+            return {"error": f"Session '{src}' is busy with a background job"}
+
+        fork_dir = os.path.join(self.path, ".fork")
+        os.makedirs(fork_dir, exist_ok=True)
+        path = os.path.abspath(os.path.join(fork_dir, f"{uuid.uuid4().hex}.pkl"))
+        try:
+            async with self._session_lock(src):
+                source = self.sessions[src]
+                dump = await self._run_fork_step(source['client'], FORK_DUMP_CODE, path, '.dump.json', timeout)
+                source['last_used'] = time.monotonic()  # don't let the capacity check below evict it
+
+            async with self._session_lock(dst):
+                if dst in self.sessions:
+                    return {"error": f"Session '{dst}' already exists, close it first or pick another name"}
+                await self._enforce_capacity()
+                target = await self._create_session(dst)
                 try:
-                    # Execute asynchronously without waiting for completion
-                    client.execute(log_observations_code)
-                    # Give a tiny bit of time for async execution
-                    time.sleep(0.05)
+                    load = await self._run_fork_step(target['client'], FORK_LOAD_CODE, path, '.load.json', timeout)
                 except Exception:
-                    pass  # Don't break execution if logging fails
-            except Exception:
-                pass  # Don't break execution if observation logging setup fails
+                    # don't leave a half-initialized dst behind, nor its empty notebook
+                    await self._shutdown_session(dst)
+                    if os.path.exists(target['filepath']):
+                        os.remove(target['filepath'])
+                    raise
+                target['store'].add_cell(nbf.new_markdown_cell(
+                    f"Forked from session `{src}`. Transferred: {', '.join(load['loaded']) or 'nothing'}"))
+        except Exception as e:
+            return {"error": f"Fork failed: {repr(e)}"}
+        finally:
+            for suffix in ('', '.dump.json', '.load.json'):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+
+        not_transferred = dict(dump['skipped'])
+        not_transferred.update(load['failed'])
+        return {
+            "src": src,
+            "dst": dst,
+            "transferred": load['loaded'],
+            "not_transferred": not_transferred,
+        }
 
-        return formatted
+    # ---- background jobs ----
+    def _running_job(self, session_name):
+        for job in self.jobs.values():
+            if job['session_name'] == session_name and job['status'] == 'running':
+                return job
+        return None
+
+    async def submit_code(self, session_name, code):
+        job = self._running_job(session_name)
+        if job:
+            return {"error": f"Session '{session_name}' is already running job {job['job_id']}"}
+        lock = self._session_lock(session_name)
+        await lock.acquire()
+        try:
+            if session_name not in self.sessions:
+                await self._enforce_capacity()
+                await self._create_session(session_name)
+        except Exception:
+            lock.release()
+            raise
+        self.job_counter += 1
+        job = {
+            'job_id': f"job-{self.job_counter}",
+            'session_name': session_name,
+            'status': 'running',
+            # session notices go to the agent around the cell's outputs, not into the notebook:
+            # an eviction/recycle before the cell on its first poll, a recycle or failure after it
+            'notices': [nbf.new_output('display_data', data=n['data']) for n in self._take_notices(session_name)],
+            'outputs': [],
+            'trailer': [],
+            'started': time.time(),
+            'finished': None,
+            'notebook': self._notebook_name(self.sessions[session_name]),
+            'cancel_requested': False,
+            'execution_stats': None,
+        }
+        self.jobs[job['job_id']] = job
+        self._prune_jobs()
+        # the task owns the session lock until the cell finishes
+        job['task'] = asyncio.create_task(self._run_job(job, code, lock))
+        return self._job_status(job)
+
+    async def _run_job(self, job, code, lock):
+        session_name = job['session_name']
+        try:
+            if job['cancel_requested']:
+                # cancelled before the cell started: the interrupt had nothing to stop
+                job['status'] = 'cancelled'
+                job['finished'] = time.time()
+                return
+            session = self.sessions[session_name]
+            await self._execute(session_name, session, code, None, 0, output_objects=job['outputs'])
+            job['execution_stats'] = session['stats'].last
+            session['last_used'] = time.monotonic()
+            job['status'] = ('cancelled' if job['cancel_requested'] else
+                             'error' if job['execution_stats']['status'] == 'died' else 'done')
+            job['finished'] = time.time()  # with the status: _prune_jobs sorts finished jobs by it
+            await self._recycle_if_oversized(session_name, session)
+            job['trailer'].extend(nbf.new_output('display_data', data=n['data']) for n in self._take_notices(session_name))
+        except asyncio.CancelledError:
+            # close_session gave up waiting for the cell
+            job['status'] = 'cancelled'
+            job['finished'] = time.time()
+            job['trailer'].append(nbf.new_output('display_data', data={'text/plain': '[SYSTEM] Job cancelled: the session was closed.'}))
+            raise
+        except Exception as e:
+            job['status'] = 'error'
+            job['finished'] = time.time()
+            job['trailer'].append(nbf.new_output('display_data', data={'text/plain': f'[SYSTEM] Job failed: {repr(e)}'}))
+        finally:
+            lock.release()
+
+    def _prune_jobs(self, keep=50):
+        finished = [j for j in self.jobs.values() if j['status'] != 'running']
+        for job in sorted(finished, key=lambda j: j['finished'] or 0)[:max(0, len(finished) - keep)]:
+            del self.jobs[job['job_id']]
+
+    def _job_status(self, job):
+        status = {
+            "job_id": job['job_id'],
+            "session_name": job['session_name'],
+            "status": job['status'],
+            "elapsed": round((job['finished'] or time.time()) - job['started'], 3),
+        }
+        if job['execution_stats']:
+            status["execution_stats"] = job['execution_stats']
+        return status
+
+    def poll_job(self, job_id, cursor=0, max_output_chars=DEFAULT_OUTPUT_BUDGET):
+        job = self.jobs.get(job_id)
+        if job is None:
+            return {"error": f"Unknown job {job_id}. Known jobs: {', '.join(self.jobs) or 'none'}"}
+        outputs = (job['notices'] + job['outputs'] + job['trailer'])[cursor:]
+        end = cursor + len(outputs)
+        status = self._job_status(job)
+        status["outputs"] = self._budget_output(f"{job['notebook']}_{job_id}_{cursor}-{end}", self._format_output(outputs), max_output_chars)
+        status["cursor"] = end
+        return status
+
+    async def cancel_job(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is None:
+            return {"error": f"Unknown job {job_id}"}
+        if job['status'] == 'running':
+            job['cancel_requested'] = True
+            if 'canceller' not in job:
+                job['canceller'] = asyncio.create_task(self._interrupt_until_done(job))
+            await asyncio.wait([job['task']], timeout=5)
+        return self._job_status(job)
+
+    async def _interrupt_until_done(self, job):
+        """Interrupt the job's kernel until its task ends; one sent before the cell starts is lost."""
+        while not job['task'].done():
+            session = self.sessions.get(job['session_name'])
+            if session:
+                try:
+                    await session['km'].interrupt_kernel()
+                except Exception:
+                    pass
+            await asyncio.wait([job['task']], timeout=1)
+
+    def session_stats(self, session_name=None):
+        names = [session_name] if session_name else list(self.sessions)
+        return {name: self.sessions[name]['stats'].summary() for name in names if name in self.sessions}
+
+    async def close_session(self, session_name):
+        job = self._running_job(session_name)
+        if job:
+            await self.cancel_job(job['job_id'])
+            if not job['task'].done():
+                # the cell ignores interrupts; stop waiting for it, the kernel is shut down below
+                job['task'].cancel()
+                await asyncio.wait([job['task']])
+        async with self._session_lock(session_name):
+            if session_name not in self.sessions:
+                return False
+            await self._shutdown_session(session_name)
+        return True
 
-    def close_session(self, session_name):
-        if session_name not in self.sessions:
-            return False
+    async def _shutdown_session(self, session_name):
+        """Stop the session's kernel and write its notebook; the caller must hold the session lock."""
         session = self.sessions.pop(session_name)
-        session['client'].stop_channels()
-        session['km'].shutdown_kernel(now=True)
-        return True
+        await self.pool.stop_kernel(session['km'], session['client'])
+        await session['store'].close()
+
+    async def close_all_sessions(self):
+        await asyncio.gather(*(self.close_session(name) for name in list(self.sessions.keys())))
+        await self.pool.shutdown()
 
-    def close_all_sessions(self):
-        for session_name in list(self.sessions.keys()):
-            self.close_session(session_name)
 
-mcp = FastMCP("Python Executor", include_fastmcp_meta=False)
 python_executer = PythonExecutor()
 
+
+@asynccontextmanager
+async def lifespan(server):
+    # the pool needs the server's event loop to start warming kernels
+    python_executer.pool.refill()
+    sweeper = asyncio.create_task(python_executer.run_sweeper())
+    try:
+        yield
+    finally:
+        sweeper.cancel()
+        await python_executer.close_all_sessions()
+
+mcp = FastMCP("Python Executor", include_fastmcp_meta=False, lifespan=lifespan)
+
+
+class ToolMetricsMiddleware(Middleware):
+    async def on_call_tool(self, context, call_next):
+        tool = context.message.name
+        MCP_CALLS.inc(tool)
+        MCP_IN_FLIGHT.inc(tool)
+        started = time.perf_counter()
+        try:
+            result = await call_next(context)
+        except Exception:
+            MCP_ERRORS.inc(tool)
+            raise
+        finally:
+            MCP_DURATION.observe(time.perf_counter() - started, tool)
+            MCP_IN_FLIGHT.dec(tool)
+        return result
+
+mcp.add_middleware(ToolMetricsMiddleware())
+
+
+def _logger_stats():
+    if toolset is None or getattr(toolset, 'logger', None) is None:
+        return None
+    try:
+        return toolset.logger.stats()
+    except Exception:
+        return None
+
+@mcp.custom_route("/metrics", methods=["GET"])
+async def metrics(request):
+    """Prometheus text exposition: MCP tools, executor state, logger queue and toolset tool calls."""
+    executor = python_executer
+    LIVE_KERNELS.set(len(executor.sessions))
+    BUSY_SESSIONS.set(sum(executor._session_lock(name).locked() for name in executor.sessions))
+    IDLE_POOL_KERNELS.set(executor.pool.idle_count())
+    RUNNING_JOBS.set(sum(job['status'] == 'running' for job in executor.jobs.values()))
+    logger_stats = await asyncio.to_thread(_logger_stats)
+    if logger_stats and 'queue_depth' in logger_stats:
+        LOGGER_QUEUE_DEPTH.set(logger_stats['queue_depth'])
+        LOGGER_WRITE_ERRORS.set(logger_stats.get('write_errors', 0))
+    extra = await asyncio.to_thread(toolset_metrics)
+    return PlainTextResponse(METRICS.render(extra), media_type="text/plain; version=0.0.4")
+
 @mcp.tool(output_schema=None)
-def execute_code(
+async def execute_code(
     session_name: Annotated[str, "Unique session ID. Same name shares state (vars, imports)."],
     code: Annotated[str, "Python code (multi-line OK). Runs in Jupyter kernel. Supports `%pip install pkg` and `!shell_cmd`."],
-    timeout: Annotated[Optional[int], "Max seconds (default: 10). Timeout interrupts but keeps session alive."]
+    timeout: Annotated[Optional[int], "Max seconds (default: 10). Timeout interrupts but keeps session alive."],
+    max_output_chars: Annotated[Optional[int], f"Max characters of output returned (default: {DEFAULT_OUTPUT_BUDGET}). Longer output keeps its head and tail; the full text is saved to a file."] = None
 ) -> list[dict]:
     """
     Run Python code in a stateful Jupyter kernel.
@@ -332,26 +810,106 @@ def execute_code(
     help(toolset)
     ```
     """
-    return python_executer.execute_code(
+    return await python_executer.execute_code(
         session_name=session_name,
         code=code,
-        timeout=timeout or 10
+        timeout=timeout or 10,
+        max_output_chars=max_output_chars or DEFAULT_OUTPUT_BUDGET
     )
 
+class BatchEntry(BaseModel):
+    session_name: str = Field(description="Session to run the code in.")
+    code: str = Field(description="Python code to run.")
+    timeout: Optional[int] = Field(default=None, description="Max seconds (default: 10).")
+
+@mcp.tool(output_schema=None)
+async def execute_batch(
+    entries: Annotated[list[BatchEntry], "Cells to run. Same session: run in order. Different sessions: run in parallel."],
+    max_output_chars: Annotated[Optional[int], "Max characters of output per entry (default: the execute_code budget split across entries)."] = None
+) -> list[dict]:
+    """
+    Run several cells in one call, e.g. a series of quick probes, or the same probe in several sessions.
+    Returns one {"session_name", "outputs"} result per entry, in the order given.
+    """
+    return await python_executer.execute_batch([e.model_dump() for e in entries], max_output_chars)
+
+@mcp.tool(output_schema=None)
+async def submit_code(
+    session_name: Annotated[str, "Session to run the code in. It stays busy until the job ends."],
+    code: Annotated[str, "Python code to run in the background, without timeout."]
+) -> dict:
+    """
+    Start long-running code (scans, brute force, crawling) as a background job and return its job_id immediately.
+    Read its output incrementally with poll_job and stop it with cancel_job; meanwhile use other sessions.
+    """
+    return await python_executer.submit_code(session_name=session_name, code=code)
+
+@mcp.tool(output_schema=None)
+def poll_job(
+    job_id: Annotated[str, "Job id returned by submit_code."],
+    cursor: Annotated[Optional[int], "Return outputs from this position on; pass the cursor of the previous poll (default: 0)."] = None,
+    max_output_chars: Annotated[Optional[int], f"Max characters of output returned (default: {DEFAULT_OUTPUT_BUDGET})."] = None
+) -> dict:
+    """Get job status (running/done/cancelled/error), new outputs since `cursor`, and the next cursor."""
+    return python_executer.poll_job(job_id, cursor or 0, max_output_chars or DEFAULT_OUTPUT_BUDGET)
+
+@mcp.tool(output_schema=None)
+async def cancel_job(job_id: Annotated[str, "Job id returned by submit_code."]) -> dict:
+    """Interrupt a running job; the session and its state are kept."""
+    return await python_executer.cancel_job(job_id)
+
+@mcp.tool(output_schema=None)
+async def fork_session(
+    src: Annotated[str, "Existing session to copy."],
+    dst: Annotated[str, "New session name; must not exist yet."]
+) -> dict:
+    """
+    Create session `dst` as a copy of session `src`: picklable variables (e.g. an authenticated requests.Session,
+    parsed data, helper functions) are copied and imported modules re-imported, so you can try several approaches
+    from the same state without redoing login/crawling. The result lists variables that could not be transferred.
+    """
+    return await python_executer.fork_session(src, dst)
+
 @mcp.tool(output_schema=None)
 def list_sessions() -> list[str]:
     """Return list of active session names."""
     return python_executer.list_sessions()
 
 @mcp.tool(output_schema=None)
-def close_session(session_name: Annotated[str, "Session to close."]) -> bool:
+async def close_session(session_name: Annotated[str, "Session to close."]) -> bool:
     """Close a session."""
-    return python_executer.close_session(session_name)
+    return await python_executer.close_session(session_name)
+
+@mcp.tool(output_schema=None)
+def session_stats(session_name: Annotated[Optional[str], "Session to report on (default: all active sessions)."] = None) -> dict:
+    """
+    Per-session execution totals: number of cells, errors, timeouts, wall/CPU time, time to first output,
+    memory growth, output bytes produced vs returned, and the slowest cell. Every execute_code result also
+    ends with an "execution_stats" item for that cell.
+    """
+    return python_executer.session_stats(session_name)
+
+@mcp.tool(output_schema=None)
+def session_events(limit: Annotated[Optional[int], "Number of most recent events (default: 20)."] = None) -> list[dict]:
+    """Recent session evictions (idle / too many kernels) and kernel recycles (memory limit)."""
+    return list(python_executer.events)[-(limit or 20):]
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--port", type=int, default=8000)
     parser.add_argument('--host', type=str, default='0.0.0.0')
+    parser.add_argument('--kernel-pool-size', type=int, default=int(os.getenv("KERNEL_POOL_SIZE", "2")),
+                        help="Idle pre-warmed kernels kept ready for new sessions (0 disables the pool)")
+    parser.add_argument('--max-sessions', type=int, default=int(os.getenv("MAX_SESSIONS", "8")),
+                        help="Max live kernels; the least recently used idle session is evicted beyond it (0: unlimited)")
+    parser.add_argument('--idle-timeout', type=int, default=int(os.getenv("SESSION_IDLE_TIMEOUT", "1800")),
+                        help="Seconds of inactivity after which a session is evicted (0: never)")
+    parser.add_argument('--max-kernel-rss-mb', type=int, default=int(os.getenv("KERNEL_MAX_RSS_MB", "2048")),
+                        help="Kernel memory (incl. child processes) above which it is restarted (0: no limit)")
     args = parser.parse_args()
+    python_executer.pool.size = args.kernel_pool_size
+    python_executer.max_sessions = args.max_sessions
+    python_executer.idle_timeout = args.idle_timeout
+    python_executer.max_rss_mb = args.max_kernel_rss_mb
     mcp.run(transport="streamable-http", host=args.host, port=args.port)
\ No newline at end of file
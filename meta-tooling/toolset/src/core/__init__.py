@@ -2,6 +2,7 @@
 
 import builtins
 from .docstring import namespace, tool, toolset, registry, DocModel
+from .metrics import metrics
 
 # Monkeypatch help to use man()
 _original_help = builtins.help
@@ -18,4 +19,4 @@ def help(obj=None):
 
 builtins.help = help
 
-__all__ = ["namespace", "tool", "toolset", "registry", "DocModel"]
+__all__ = ["namespace", "tool", "toolset", "registry", "DocModel", "metrics"]
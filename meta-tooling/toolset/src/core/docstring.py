@@ -4,9 +4,11 @@ import inspect
 import re
 import sys
 import textwrap
+import time
 from functools import wraps
 from typing import Callable, Any
 from pydantic import BaseModel, Field
+from .metrics import metrics
 
 
 def md_section(level: int, title: str, *content: str) -> str:
@@ -227,14 +229,28 @@ def tool(name: str | None = None, desc: str | None = None):
     def wrap(func):
         tool_name = name or func.__name__
         doc_model = DocModel(description=desc) if desc else DocModel.from_function(func)
+        # e.g. "proxy.list_traffic", the module name stands for the toolset
+        metric_name = f"{func.__module__.rsplit('.', 1)[-1]}.{tool_name}"
 
         @wraps(func)
         async def async_wrapped(*a, **k):
-            return await func(*a, **k)
+            started, error = time.perf_counter(), True
+            try:
+                result = await func(*a, **k)
+                error = False
+                return result
+            finally:
+                metrics.record(metric_name, time.perf_counter() - started, error)
 
         @wraps(func)
         def sync_wrapped(*a, **k):
-            return func(*a, **k)
+            started, error = time.perf_counter(), True
+            try:
+                result = func(*a, **k)
+                error = False
+                return result
+            finally:
+                metrics.record(metric_name, time.perf_counter() - started, error)
 
         wrapped = async_wrapped if inspect.iscoroutinefunction(func) else sync_wrapped
         wrapped.__tool_name__ = tool_name
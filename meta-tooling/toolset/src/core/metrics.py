@@ -0,0 +1,73 @@
+"""Per-process call metrics for tools, exported as snapshot files for the executor's /metrics."""
+
+import atexit
+import json
+import os
+import threading
+import time
+
+METRICS_DIR_ENV = "TOOLSET_METRICS_DIR"
+DEFAULT_METRICS_DIR = "/tmp/toolset_metrics"
+# upper bounds in seconds, shared with the /metrics histograms
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class ToolMetrics:
+    """
+    Call count, error count and latency histogram per tool. Tools run inside Jupyter kernels
+    and other processes, so each process writes its totals to <dir>/<pid>.json (at most every
+    `interval` seconds and at exit) and the executor sums the files when scraped.
+    """
+
+    def __init__(self, directory: str | None = None, interval: float = 1.0):
+        self.directory = directory or os.getenv(METRICS_DIR_ENV, DEFAULT_METRICS_DIR)
+        self.interval = interval
+        self._tools: dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._last_write = 0.0
+        self._dirty = False
+        self._timer: threading.Timer | None = None
+        atexit.register(self.write)
+
+    def record(self, name: str, seconds: float, error: bool = False) -> None:
+        with self._lock:
+            entry = self._tools.get(name)
+            if entry is None:
+                entry = self._tools[name] = {"calls": 0, "errors": 0, "sum": 0.0, "buckets": [0] * len(BUCKETS)}
+            entry["calls"] += 1
+            entry["errors"] += error
+            entry["sum"] += seconds
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    entry["buckets"][i] += 1
+                    break
+            self._dirty = True
+            wait = self._last_write + self.interval - time.monotonic()
+            if wait > 0 and self._timer is None:
+                # trailing write, so the last calls of a burst show up without another call
+                self._timer = threading.Timer(wait, self.write)
+                self._timer.daemon = True
+                self._timer.start()
+        if wait <= 0:
+            self.write()
+
+    def write(self) -> None:
+        """Write this process's totals; never raises, metrics must not break a tool call."""
+        with self._lock:
+            self._timer = None
+            if not self._dirty:
+                return
+            snapshot = {"pid": os.getpid(), "buckets": list(BUCKETS), "tools": json.loads(json.dumps(self._tools))}
+            self._dirty = False
+            self._last_write = time.monotonic()
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, f"{os.getpid()}.json")
+            with open(path + ".tmp", "w") as f:
+                json.dump(snapshot, f)
+            os.replace(path + ".tmp", path)
+        except OSError:
+            pass
+
+
+metrics = ToolMetrics()
@@ -64,7 +64,8 @@ class Browser:
             for page in ctx.pages:
                 try:
                     content = await page.content()
-                    toolset.logger.log_observation(content, "webpage_source")
+                    from ..logger import logger
+                    logger.log_observation(content, "webpage_source")
                 except Exception:
                     continue
         except Exception:
@@ -19,11 +19,15 @@ _debug_log("before namespace()", "toolset/logger/__init__.py:8", "B,C")
 namespace()
 
 _debug_log("before PenetrationLogger import", "toolset/logger/__init__.py:11", "B")
-from .logger import PenetrationLogger
+from .logger import PenetrationLogger, compact_journal, replay_journal
+from .blobstore import is_blob_ref, read_blob
+from .client import LoggerClient, LOGGER_SOCKET_ENV
 
 _debug_log("before PenetrationLogger()", "toolset/logger/__init__.py:14", "B")
 try:
-    _logger_instance = PenetrationLogger()
+    # inside the sandbox all processes share the logger service; standalone use keeps a private log
+    _socket_path = os.getenv(LOGGER_SOCKET_ENV)
+    _logger_instance = LoggerClient(_socket_path) if _socket_path else PenetrationLogger()
     _debug_log("PenetrationLogger() succeeded", "toolset/logger/__init__.py:17", "B", {"instance_type":str(type(_logger_instance))})
 except Exception as e:
     _debug_log("PenetrationLogger() failed", "toolset/logger/__init__.py:20", "B", {"error":str(e),"error_type":type(e).__name__})
@@ -45,11 +49,8 @@ class LoggerTools:
         """
         Log a planning string for the current or next step.
         """
-        # start a new step if current planning already exists
-        log = self._logger.get_log()
-        if log["steps"] and log["steps"][-1].get("planning"):
-            self._logger.next_step()
-        self._logger.log_planning(planning)
+        # starts a new step if current planning already exists
+        self._logger.log_planning_step(planning)
         return "planning logged"
 
     @tool()
@@ -64,5 +65,5 @@ class LoggerTools:
 logger = _logger_instance
 logger_tools = LoggerTools()
 
-__all__ = ["logger", "logger_tools", "PenetrationLogger"]
+__all__ = ["logger", "logger_tools", "PenetrationLogger", "LoggerClient", "compact_journal", "replay_journal", "is_blob_ref", "read_blob"]
 
@@ -0,0 +1,126 @@
+import gzip
+import hashlib
+import os
+import threading
+from typing import Any, Dict, Optional
+
+
+BLOB_KEY = "$blob"
+
+
+class BlobStore:
+    """
+    Content-addressed store for large observation payloads.
+
+    Strings of at least `threshold` bytes are written once to
+    <root>/<sha[:2]>/<sha>[.gz] and replaced in the log by a small reference:
+    {"$blob": "sha256:<hex>", "path": "blobs/ab/<hex>.gz", "size": 123456, "compression": "gzip"}
+    Identical payloads (the same page source logged again and again) share one file.
+    """
+
+    def __init__(self, root: str, threshold: int = 16384, compress: bool = True) -> None:
+        self._root = root
+        self._threshold = threshold
+        self._compress = compress
+        self._known: set = set()
+        self._lock = threading.Lock()
+        self._stats = {"blobs_written": 0, "blobs_deduplicated": 0, "bytes_written": 0, "bytes_referenced": 0}
+
+    @classmethod
+    def from_env(cls, workspace_dir: str) -> "BlobStore":
+        """
+        Blob store under <workspace>/blobs configured by PENTEST_LOG_BLOB_THRESHOLD
+        (bytes, 0 disables) and PENTEST_LOG_BLOB_COMPRESS (0 stores blobs raw).
+        """
+        return cls(
+            os.path.join(workspace_dir, "blobs"),
+            threshold=int(os.getenv("PENTEST_LOG_BLOB_THRESHOLD", "16384")),
+            compress=os.getenv("PENTEST_LOG_BLOB_COMPRESS", "1") != "0",
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self._threshold > 0
+
+    def externalize(self, value: Any) -> Any:
+        """
+        Return `value` with every large string (at any depth of dicts/lists) replaced by a blob reference.
+        """
+        if not self.enabled:
+            return value
+        if isinstance(value, str):
+            # utf-8 size is between len() and 4 * len(), only encode when it is ambiguous
+            if len(value) * 4 < self._threshold:
+                return value
+            if len(value) >= self._threshold or len(value.encode("utf-8")) >= self._threshold:
+                return self.put(value)
+            return value
+        if isinstance(value, dict):
+            return {k: self.externalize(v) for k, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [self.externalize(v) for v in value]
+        return value
+
+    def put(self, text: str) -> Dict[str, Any]:
+        data = text.encode("utf-8", errors="replace")
+        digest = hashlib.sha256(data).hexdigest()
+        suffix = ".gz" if self._compress else ""
+        rel_path = os.path.join(os.path.basename(self._root), digest[:2], digest + suffix)
+        abs_path = os.path.join(self._root, digest[:2], digest + suffix)
+
+        with self._lock:
+            seen = digest in self._known or os.path.exists(abs_path)
+            if seen:
+                self._known.add(digest)
+            self._stats["bytes_referenced"] += len(data)
+            if seen:
+                self._stats["blobs_deduplicated"] += 1
+
+        if not seen:
+            os.makedirs(os.path.dirname(abs_path), exist_ok=True)
+            payload = gzip.compress(data, compresslevel=1) if self._compress else data
+            # unique tmp name: several processes may store the same blob concurrently
+            tmp_path = f"{abs_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                with open(tmp_path, "wb") as f:
+                    f.write(payload)
+                os.replace(tmp_path, abs_path)
+            except BaseException:
+                # not known yet: the next put of this content writes it again
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+                raise
+            with self._lock:
+                self._known.add(digest)
+                self._stats["blobs_written"] += 1
+                self._stats["bytes_written"] += len(payload)
+
+        return {
+            BLOB_KEY: f"sha256:{digest}",
+            "path": rel_path,
+            "size": len(data),
+            "compression": "gzip" if self._compress else None,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._stats)
+
+
+def is_blob_ref(value: Any) -> bool:
+    return isinstance(value, dict) and BLOB_KEY in value
+
+
+def read_blob(ref: Dict[str, Any], workspace_dir: Optional[str] = None) -> str:
+    """
+    Load the text behind a blob reference; `path` is relative to the workspace directory.
+    """
+    if workspace_dir is None:
+        workspace_dir = os.getenv("WORKSPACE_DIR", os.path.join(os.path.expanduser("~"), "Workspace"))
+    with open(os.path.join(workspace_dir, ref["path"]), "rb") as f:
+        data = f.read()
+    if ref.get("compression") == "gzip":
+        data = gzip.decompress(data)
+    return data.decode("utf-8", errors="replace")
@@ -0,0 +1,161 @@
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from .blobstore import BlobStore
+from .logger import PenetrationLogger, infer_observation_type
+
+
+# Set by entrypoint.sh / the runner; when present every process logs through the shared service.
+LOGGER_SOCKET_ENV = "PENTEST_LOGGER_SOCKET"
+DEFAULT_SOCKET_PATH = "/tmp/penetration_logger.sock"
+
+
+class LoggerClient:
+    """
+    Drop-in replacement for PenetrationLogger that forwards every call to the
+    shared logger service (toolset.logger.service) over a Unix socket.
+
+    Write calls are fire-and-forget lines on a persistent connection, so they cost
+    one send() and never wait for the service. Large observation strings are moved
+    to the blob store in the calling process and only their reference is sent.
+    If the service cannot be reached the client falls back to a private
+    PenetrationLogger, so logging degrades instead of breaking tools.
+    """
+
+    def __init__(self, socket_path: str, connect_timeout: float = 10.0) -> None:
+        self._socket_path = socket_path
+        self._connect_timeout = connect_timeout
+        self._lock = threading.Lock()
+        self._sock: Optional[socket.socket] = None
+        self._rfile = None
+        self._next_id = 0
+        self._connected_once = False
+        self._fallback: Optional[PenetrationLogger] = None
+
+        workspace_dir = os.getenv("WORKSPACE_DIR", str(Path.home() / "Workspace"))
+        self._blobs = BlobStore.from_env(workspace_dir)
+
+    # ---- transport ----
+    def _connect(self) -> None:
+        # the service may still be starting when the first event arrives, wait for it once
+        deadline = time.monotonic() + (0 if self._connected_once else self._connect_timeout)
+        delay = 0.02
+        while True:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(self._socket_path)
+                break
+            except (FileNotFoundError, ConnectionRefusedError):
+                sock.close()
+                if time.monotonic() >= deadline:
+                    raise
+                time.sleep(delay)
+                delay = min(delay * 2, 0.5)
+        self._sock = sock
+        self._rfile = sock.makefile("rb")
+        self._connected_once = True
+
+    def _disconnect(self) -> None:
+        if self._rfile is not None:
+            self._rfile.close()
+            self._rfile = None
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    def _call(self, op: str, *args: Any, wait: bool = False) -> Any:
+        with self._lock:
+            if self._fallback is None:
+                # one reconnect attempt covers a restarted service, then give up
+                for attempt in range(2):
+                    try:
+                        if self._sock is None:
+                            self._connect()
+                        msg: Dict[str, Any] = {"op": op, "args": list(args)}
+                        if wait:
+                            self._next_id += 1
+                            msg["id"] = self._next_id
+                        self._sock.sendall((json.dumps(msg, ensure_ascii=False) + "\n").encode("utf-8"))
+                        if not wait:
+                            return None
+                        line = self._rfile.readline()
+                        if not line:
+                            raise ConnectionError("logger service closed the connection")
+                        reply = json.loads(line)
+                        if "error" in reply:
+                            raise RuntimeError(f"logger service: {reply['error']}")
+                        return reply.get("result")
+                    except OSError as e:
+                        self._disconnect()
+                        error = e
+                print(
+                    f"[LOGGER] Service at {self._socket_path} unreachable ({error!r}), logging locally",
+                    file=sys.stderr,
+                )
+                self._fallback = PenetrationLogger()
+        return getattr(self._fallback, op)(*args)
+
+    # ---- PenetrationLogger API ----
+    def set_initial_prompt(self, prompt: str) -> None:
+        self._call("set_initial_prompt", prompt)
+
+    def next_step(self) -> int:
+        """
+        Manually start a new step; returns its step_number.
+        """
+        return self._call("next_step", wait=True)
+
+    def log_planning(self, planning_text: str) -> None:
+        self._call("log_planning", planning_text)
+
+    def log_planning_step(self, planning_text: str) -> int:
+        return self._call("log_planning_step", planning_text, wait=True)
+
+    def log_code(self, code: str) -> None:
+        self._call("log_code", code)
+
+    def log_observation(self, raw_data: Any, obs_type: str) -> None:
+        """
+        Log an observation with explicit type.
+        """
+        self._call("log_observation", self._blobs.externalize(raw_data), obs_type)
+
+    def auto_observation(self, raw_data: Any, default_type: str = "code_output") -> None:
+        self.log_observation(raw_data, infer_observation_type(raw_data, default_type))
+
+    def set_final_report(self, report: str) -> None:
+        # waits so the report is on disk before e.g. the runner stops the sandbox
+        self._call("set_final_report", report, wait=True)
+
+    def compact(self) -> str:
+        return self._call("compact", wait=True)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        return self._call("flush", timeout, wait=True)
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self._call("stats", wait=True)
+        stats["client_blobs"] = self._blobs.stats()
+        return stats
+
+    def close(self) -> None:
+        """
+        Drop the connection; the service (and its log) stays up for other processes.
+        """
+        with self._lock:
+            self._disconnect()
+
+    def get_log(self) -> Dict[str, Any]:
+        return self._call("get_log", wait=True)
+
+    def get_filepath(self) -> str:
+        return self._call("get_filepath", wait=True)
+
+    def get_journal_path(self) -> Optional[str]:
+        return self._call("get_journal_path", wait=True)
@@ -1,10 +1,123 @@
+import atexit
 import json
 import os
 import threading
+import time
 from datetime import datetime
 from pathlib import Path
 from typing import Any, Dict, Optional
 
+from .blobstore import BlobStore
+from .writer import GroupCommitWriter
+
+
+# "journal": append one JSONL record per event and compact to JSON on demand / at exit.
+# "snapshot": legacy behaviour, rewrite the whole JSON file on every event.
+LOG_MODES = ("journal", "snapshot")
+
+
+class _LogState:
+    """
+    In-memory log document plus the state machine that applies journal records to it.
+    Shared by the live logger and by journal replay, so both always agree on the schema.
+    """
+
+    def __init__(self) -> None:
+        self.data: Dict[str, Any] = {
+            "initial_prompt": "",
+            "steps": [],
+            "final_report": "",
+        }
+        self.current_step_index: Optional[int] = None
+
+    def new_step(self) -> int:
+        step_number = len(self.data["steps"]) + 1
+        self.data["steps"].append(
+            {
+                "step_number": step_number,
+                "planning": "",
+                "code": "",
+                "observation": [],
+            }
+        )
+        self.current_step_index = len(self.data["steps"]) - 1
+        return self.current_step_index
+
+    def ensure_step(self) -> int:
+        """
+        Ensure there is an active step; if not, create a new one.
+        Returns current step index.
+        """
+        if self.current_step_index is None:
+            return self.new_step()
+        return self.current_step_index
+
+    def apply(self, record: Dict[str, Any]) -> None:
+        event = record.get("event")
+        if event == "initial_prompt":
+            self.data["initial_prompt"] = record["value"]
+        elif event == "next_step":
+            self.new_step()
+        elif event == "planning":
+            self.data["steps"][self.ensure_step()]["planning"] = record["value"]
+        elif event == "code":
+            self.data["steps"][self.ensure_step()]["code"] = record["value"]
+        elif event == "observation":
+            self.data["steps"][self.ensure_step()]["observation"].append(
+                {
+                    "observation_raw": record["raw"],
+                    "observation_type": record["type"],
+                }
+            )
+        elif event == "final_report":
+            self.data["final_report"] = record["value"]
+
+
+def infer_observation_type(raw_data: Any, default_type: str = "code_output") -> str:
+    """
+    Guess observation_type from the payload, fall back to default_type.
+    """
+    if isinstance(raw_data, str):
+        lower = raw_data.lower()
+        if "<html" in lower or "<!doctype html" in lower:
+            return "webpage_source"
+        if "http/" in lower and "host:" in lower:
+            return "http_traffic"
+    return default_type
+
+
+def replay_journal(journal_path: str) -> Dict[str, Any]:
+    """
+    Rebuild the penetration_log_*.json document from a journal file.
+    A truncated last line (e.g. the process was killed mid-write) is ignored.
+    """
+    state = _LogState()
+    with open(journal_path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            state.apply(record)
+    return state.data
+
+
+def compact_journal(journal_path: str, json_path: Optional[str] = None) -> str:
+    """
+    Materialize a journal into the regular JSON log next to it; returns the JSON path.
+    """
+    if json_path is None:
+        json_path = os.path.splitext(journal_path)[0] + ".json"
+    data = replay_journal(journal_path)
+    tmp_path = json_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, json_path)
+    return json_path
+
 
 class PenetrationLogger:
     """
@@ -26,89 +139,104 @@ class PenetrationLogger:
         ],
         "final_report": "XXX"
     }
+
+    In journal mode (default, or PENTEST_LOG_MODE=journal) every event is appended
+    to penetration_log_*.jsonl, so per-event cost does not grow with the log; the
+    JSON document above is rebuilt by compact(), which also runs at interpreter exit.
+    Journal records are handed to a background GroupCommitWriter, so logging never
+    waits on disk; batch size and window come from PENTEST_LOG_BATCH and
+    PENTEST_LOG_FLUSH_MS.
+
+    Observation strings larger than PENTEST_LOG_BLOB_THRESHOLD bytes (0 disables)
+    are stored once in the content-addressed Workspace/blobs directory and the step
+    only keeps a {"$blob": ...} reference; PENTEST_LOG_BLOB_COMPRESS=0 stores them raw.
     """
 
-    def __init__(self) -> None:
+    def __init__(self, mode: Optional[str] = None) -> None:
         # workspace in container is /home/ubuntu/Workspace
         workspace_dir = os.getenv("WORKSPACE_DIR", str(Path.home() / "Workspace"))
         self._logs_dir = os.path.join(workspace_dir, "logs")
         os.makedirs(self._logs_dir, exist_ok=True)
+        self._blobs = BlobStore.from_env(workspace_dir)
+
+        self._mode = mode or os.getenv("PENTEST_LOG_MODE", "journal")
+        if self._mode not in LOG_MODES:
+            raise ValueError(f"Unknown log mode {self._mode!r}, expected one of {LOG_MODES}")
 
         self._lock = threading.Lock()
-        self._data: Dict[str, Any] = {
-            "initial_prompt": "",
-            "steps": [],
-            "final_report": "",
-        }
-        self._current_step_index: Optional[int] = None
+        self._state = _LogState()
+        self._data = self._state.data
 
         ts = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
         self._filepath = os.path.join(self._logs_dir, f"penetration_log_{ts}.json")
+        self._journal_path = os.path.join(self._logs_dir, f"penetration_log_{ts}.jsonl")
+        self._writer: Optional[GroupCommitWriter] = None  # started lazily on first event
+        self._dirty = False  # journal has events not yet compacted into the JSON file
 
-    # ---- core helpers ----
-    def _ensure_step(self) -> int:
-        """
-        Ensure there is an active step; if not, create a new one.
-        Returns current step index.
-        """
-        if self._current_step_index is None:
-            step_number = len(self._data["steps"]) + 1
-            self._data["steps"].append(
-                {
-                    "step_number": step_number,
-                    "planning": "",
-                    "code": "",
-                    "observation": [],
-                }
-            )
-            self._current_step_index = len(self._data["steps"]) - 1
-        return self._current_step_index
-
-    def _append_observation(self, obs: Dict[str, Any]) -> None:
-        idx = self._ensure_step()
-        self._data["steps"][idx]["observation"].append(obs)
+        if self._mode == "journal":
+            atexit.register(self.close)
 
+    # ---- core helpers ----
     def _dump(self) -> None:
         tmp_path = self._filepath + ".tmp"
         with open(tmp_path, "w", encoding="utf-8") as f:
             json.dump(self._data, f, ensure_ascii=False, indent=2)
         os.replace(tmp_path, self._filepath)
 
+    def _append_journal(self, record: Dict[str, Any]) -> None:
+        if self._writer is None:
+            self._writer = GroupCommitWriter(
+                self._journal_path,
+                max_batch=int(os.getenv("PENTEST_LOG_BATCH", "256")),
+                max_delay=int(os.getenv("PENTEST_LOG_FLUSH_MS", "200")) / 1000,
+            )
+        # serialized here so later mutation of raw_data by the caller can't leak in
+        self._writer.submit(json.dumps(record, ensure_ascii=False) + "\n")
+        self._dirty = True
+
+    def _emit(self, event: str, **fields: Any) -> None:
+        """
+        Apply an event to the in-memory log and persist it. Caller must hold _lock.
+        """
+        record = {"event": event, "ts": time.time(), **fields}
+        self._state.apply(record)
+        if self._mode == "journal":
+            self._append_journal(record)
+        else:
+            self._dump()
+
     # ---- public API ----
     def set_initial_prompt(self, prompt: str) -> None:
         with self._lock:
-            self._data["initial_prompt"] = prompt
-            self._dump()
+            self._emit("initial_prompt", value=prompt)
 
     def next_step(self) -> int:
         """
         Manually start a new step; returns its step_number.
         """
         with self._lock:
-            step_number = len(self._data["steps"]) + 1
-            self._data["steps"].append(
-                {
-                    "step_number": step_number,
-                    "planning": "",
-                    "code": "",
-                    "observation": [],
-                }
-            )
-            self._current_step_index = len(self._data["steps"]) - 1
-            self._dump()
-            return step_number
+            self._emit("next_step")
+            return len(self._data["steps"])
 
     def log_planning(self, planning_text: str) -> None:
         with self._lock:
-            idx = self._ensure_step()
-            self._data["steps"][idx]["planning"] = planning_text
-            self._dump()
+            self._emit("planning", value=planning_text)
+
+    def log_planning_step(self, planning_text: str) -> int:
+        """
+        Log planning, starting a new step first if the current one is already planned.
+        Returns the step_number the planning was logged to.
+        """
+        with self._lock:
+            idx = self._state.current_step_index
+            if idx is not None and self._data["steps"][idx].get("planning"):
+                self._emit("next_step")
+            self._emit("planning", value=planning_text)
+            return self._data["steps"][self._state.current_step_index]["step_number"]
 
     def log_code(self, code: str) -> None:
         with self._lock:
-            idx = self._ensure_step()
-            self._data["steps"][idx]["code"] = code
-            self._dump()
+            self._emit("code", value=code)
 
     def log_observation(
         self,
@@ -118,13 +246,10 @@ class PenetrationLogger:
         """
         Log an observation with explicit type.
         """
+        # hashing/writing blobs happens outside the lock, it only touches the blob directory
+        raw_data = self._blobs.externalize(raw_data)
         with self._lock:
-            obs = {
-                "observation_raw": raw_data,
-                "observation_type": obs_type,
-            }
-            self._append_observation(obs)
-            self._dump()
+            self._emit("observation", raw=raw_data, type=obs_type)
 
     def auto_observation(
         self,
@@ -135,19 +260,48 @@ class PenetrationLogger:
         Convenience wrapper: try to infer observation_type from context,
         fall back to default_type.
         """
-        inferred_type = default_type
-        if isinstance(raw_data, str):
-            lower = raw_data.lower()
-            if "<html" in lower or "<!doctype html" in lower:
-                inferred_type = "webpage_source"
-            elif "http/" in lower and "host:" in lower:
-                inferred_type = "http_traffic"
-        self.log_observation(raw_data, inferred_type)
+        self.log_observation(raw_data, infer_observation_type(raw_data, default_type))
 
     def set_final_report(self, report: str) -> None:
         with self._lock:
-            self._data["final_report"] = report
-            self._dump()
+            self._emit("final_report", value=report)
+        # the final report marks the end of the engagement, materialize right away
+        self.compact()
+
+    def compact(self) -> str:
+        """
+        Write the current log to penetration_log_*.json; returns its path.
+        In snapshot mode the file is already up to date.
+        """
+        with self._lock:
+            if self._mode == "journal" and self._dirty:
+                self._dump()
+                self._dirty = False
+        return self._filepath
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Block until every event logged so far is written to the journal.
+        """
+        writer = self._writer
+        return writer.flush(timeout) if writer is not None else True
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Writer counters: queue depth, records/batches written and flush latency.
+        """
+        writer = self._writer
+        stats = writer.stats() if writer is not None else {}
+        stats["mode"] = self._mode
+        stats["blobs"] = self._blobs.stats()
+        return stats
+
+    def close(self) -> None:
+        self.compact()
+        with self._lock:
+            writer, self._writer = self._writer, None
+        if writer is not None:
+            writer.close()
 
     # ---- inspection helpers (not used by tools directly) ----
     def get_log(self) -> Dict[str, Any]:
@@ -157,3 +311,5 @@ class PenetrationLogger:
     def get_filepath(self) -> str:
         return self._filepath
 
+    def get_journal_path(self) -> Optional[str]:
+        return self._journal_path if self._mode == "journal" else None
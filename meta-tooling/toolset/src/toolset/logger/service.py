@@ -0,0 +1,93 @@
+"""
+Shared logger service: one PenetrationLogger per sandbox run, reached by every
+process (init script, MCP server, Jupyter kernels) through LoggerClient.
+
+Run with: python3 -m toolset.logger.service --socket /tmp/penetration_logger.sock
+
+Protocol: newline-delimited JSON over a Unix stream socket. Each request is
+{"op": "<method>", "args": [...]} and gets a {"id": ..., "result"|"error": ...}
+reply only when it carries an "id".
+"""
+import argparse
+import json
+import os
+import signal
+import socketserver
+import threading
+
+from .client import DEFAULT_SOCKET_PATH, LOGGER_SOCKET_ENV
+from .logger import LOG_MODES, PenetrationLogger
+
+# PenetrationLogger methods callable over the socket; close() belongs to the service only
+SERVICE_OPS = {
+    "set_initial_prompt",
+    "next_step",
+    "log_planning",
+    "log_planning_step",
+    "log_code",
+    "log_observation",
+    "set_final_report",
+    "compact",
+    "flush",
+    "stats",
+    "get_log",
+    "get_filepath",
+    "get_journal_path",
+}
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        logger = self.server.logger
+        for line in self.rfile:
+            try:
+                msg = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            op = msg.get("op")
+            try:
+                if op not in SERVICE_OPS:
+                    raise ValueError(f"unknown op {op!r}")
+                reply = {"result": getattr(logger, op)(*msg.get("args", []))}
+            except Exception as e:
+                reply = {"error": f"{type(e).__name__}: {e}"}
+            if "id" in msg:
+                reply["id"] = msg["id"]
+                self.wfile.write((json.dumps(reply, ensure_ascii=False) + "\n").encode("utf-8"))
+                self.wfile.flush()
+
+
+class LoggerService(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, logger: PenetrationLogger) -> None:
+        self.logger = logger
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)  # stale socket from a previous run
+        super().__init__(socket_path, _Handler)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--socket", type=str, default=os.getenv(LOGGER_SOCKET_ENV, DEFAULT_SOCKET_PATH))
+    parser.add_argument("--mode", type=str, choices=LOG_MODES, default=None)
+    args = parser.parse_args()
+
+    logger = PenetrationLogger(mode=args.mode)
+    server = LoggerService(args.socket, logger)
+    # shutdown() blocks until serve_forever() returns, so it can't run in the handler itself
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown).start())
+    print(f"Logger service listening on {args.socket}, log file: {logger.get_filepath()}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        logger.close()
+        if os.path.exists(args.socket):
+            os.unlink(args.socket)
+
+
+if __name__ == "__main__":
+    main()
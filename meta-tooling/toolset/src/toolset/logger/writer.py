@@ -0,0 +1,129 @@
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+
+class GroupCommitWriter:
+    """
+    Append lines to a file from a dedicated background thread.
+
+    submit() only enqueues, so callers never wait on disk. The writer thread
+    drains the queue in batches and commits a batch when it holds max_batch
+    lines or when max_delay seconds have passed since its first line,
+    whichever comes first. flush() blocks until everything submitted before
+    it is on disk.
+    """
+
+    def __init__(self, path: str, max_batch: int = 256, max_delay: float = 0.2) -> None:
+        self._path = path
+        self._max_batch = max_batch
+        self._max_delay = max_delay
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._file = None  # opened lazily by the writer thread
+        self._closed = False
+
+        self._stats_lock = threading.Lock()
+        self._stats: Dict[str, Any] = {
+            "queue_depth_max": 0,
+            "records_written": 0,
+            "batches_written": 0,
+            "flush_latency_last_ms": 0.0,
+            "flush_latency_max_ms": 0.0,
+            "flush_latency_total_ms": 0.0,
+            "write_errors": 0,
+        }
+
+        self._thread = threading.Thread(target=self._run, name="logger-writer", daemon=True)
+        self._thread.start()
+
+    # ---- producer side ----
+    def submit(self, line: str) -> None:
+        if self._closed:
+            raise RuntimeError("writer is closed")
+        self._queue.put(line)
+        depth = self._queue.qsize()
+        if depth > self._stats["queue_depth_max"]:
+            with self._stats_lock:
+                self._stats["queue_depth_max"] = max(self._stats["queue_depth_max"], depth)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Block until all lines submitted so far are written; returns False on timeout.
+        """
+        if self._closed:
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout: Optional[float] = 5.0) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        batches = stats["batches_written"]
+        stats["queue_depth"] = self._queue.qsize()
+        stats["flush_latency_avg_ms"] = stats["flush_latency_total_ms"] / batches if batches else 0.0
+        return stats
+
+    # ---- writer thread ----
+    def _run(self) -> None:
+        stop = False
+        while not stop:
+            item = self._queue.get()
+            batch: List[str] = []
+            waiters: List[threading.Event] = []
+            deadline = time.monotonic() + self._max_delay
+
+            # collect until batch is full, the window closes, or a flush/close is requested
+            while True:
+                if item is None:
+                    stop = True
+                    break
+                if isinstance(item, threading.Event):
+                    waiters.append(item)
+                    break
+                batch.append(item)
+                if len(batch) >= self._max_batch:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+
+            if batch:
+                self._commit(batch)
+            for waiter in waiters:
+                waiter.set()
+
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _commit(self, batch: List[str]) -> None:
+        start = time.perf_counter()
+        try:
+            if self._file is None:
+                self._file = open(self._path, "a", encoding="utf-8")
+            self._file.write("".join(batch))
+            self._file.flush()
+        except Exception:
+            with self._stats_lock:
+                self._stats["write_errors"] += 1
+            return
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with self._stats_lock:
+            self._stats["records_written"] += len(batch)
+            self._stats["batches_written"] += 1
+            self._stats["flush_latency_last_ms"] = elapsed_ms
+            self._stats["flush_latency_max_ms"] = max(self._stats["flush_latency_max_ms"], elapsed_ms)
+            self._stats["flush_latency_total_ms"] += elapsed_ms
@@ -1,95 +1,264 @@
 from typing import Annotated
+import asyncio
 import base64
 import os
-from gql import gql, Client
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from gql import gql, Client, GraphQLRequest
 from gql.transport.requests import RequestsHTTPTransport
 
 from core import tool, toolset, namespace
 
 namespace()
 
+# Parsed once at import. Only the DocumentNode is shared: gql stores the variables in the
+# GraphQLRequest it executes, so every call wraps the document in a request of its own
+LIST_TRAFFIC = gql("""
+    query($offset: Int, $limit: Int, $filter: HTTPQL) {
+      interceptEntriesByOffset(
+        limit: $limit
+        offset: $offset
+        filter: $filter
+        order: {by: REQ_CREATED_AT, ordering: DESC}
+      ) {
+        count {
+          value
+        }
+        nodes {
+          request {
+            id
+            createdAt
+            host
+            port
+            method
+            path
+            query
+            length
+            response {
+              length
+              roundtripTime
+              statusCode
+            }
+          }
+        }
+      }
+    }
+""").document
+
+VIEW_TRAFFIC = gql("""
+    query ($id: ID!) {
+      request(id: $id) {
+        id
+        isTls
+        host
+        port
+        raw
+        response {
+            roundtripTime
+            raw
+        }
+      }
+    }
+""").document
+
+REQUEST_FIELDS = """
+    id
+    isTls
+    host
+    port
+    raw
+    response {
+        roundtripTime
+        raw
+    }
+"""
+
+# Requests per aliased query in view_traffic_many
+VIEW_MANY_BATCH = 50
+
+
+@lru_cache(maxsize=None)
+def view_many_document(size: int):
+    """One query fetching `size` requests through aliases r0..r{size-1}; parsed once per size."""
+    variables = ", ".join(f"$id{i}: ID!" for i in range(size))
+    fields = "\n".join(f"r{i}: request(id: $id{i}) {{{REQUEST_FIELDS}}}" for i in range(size))
+    return gql(f"query ({variables}) {{\n{fields}\n}}").document
+
+
+def decode_raw(raw: str, b64encode: bool=False, max_bytes: int=None) -> tuple[str, bool]:
+    """Base64 raw message from Caido -> (text, or base64 if b64encode; whether it was cut to max_bytes)."""
+    data = base64.b64decode(raw)
+    truncated = bool(max_bytes) and len(data) > max_bytes
+    if truncated:
+        data = data[:max_bytes]
+    if b64encode:
+        return base64.b64encode(data).decode(), truncated
+    return data.decode('utf-8', errors='replace'), truncated
+
 
 @toolset()
 class Proxy:
     def __init__(self, url: str, token: str):
-        transport = RequestsHTTPTransport(url=url, headers={'Authorization': f'Bearer {token}'})
-        self.__client = Client(transport=transport)
-    
+        self.__url = url
+        self.__headers = {'Authorization': f'Bearer {token}'}
+        self.__local = threading.local()
+        # long-lived workers for view_traffic_many, so their per-thread sessions are reused;
+        # at most 8 in flight, below the 10 keep-alive connections requests pools per host
+        self.__pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="proxy")
+
+    def _session(self):
+        # One connected gql session per thread (the *_async variants run in worker threads), kept
+        # for the thread's lifetime so keep-alive connections are reused instead of
+        # client.execute() opening and closing a session on every call
+        session = getattr(self.__local, 'session', None)
+        if session is None:
+            transport = RequestsHTTPTransport(url=self.__url, headers=self.__headers, retries=2)
+            session = self.__local.session = Client(transport=transport).connect_sync()
+        return session
+
+    def _execute(self, document, variables: dict) -> dict:
+        return self._session().execute(GraphQLRequest(document, variable_values=variables))
+
     @tool()
     def list_traffic(self, limit: int=5, offset: int=0, filter: Annotated[str, '''Caido HTTPQL statement, such as ' req.host.like:"%.example.com" and req.method.like:"POST" ' ''']=None) -> dict:
-        query = gql("""
-            query($offset: Int, $limit: Int, $filter: HTTPQL) {
-              interceptEntriesByOffset(
-                limit: $limit
-                offset: $offset
-                filter: $filter
-                order: {by: REQ_CREATED_AT, ordering: DESC}
-              ) {
-                count {
-                  value
-                }
-                nodes {
-                  request {
-                    id
-                    createdAt
-                    host
-                    port
-                    method
-                    path
-                    query
-                    length
-                    response {
-                      length
-                      roundtripTime
-                      statusCode
-                    }
-                  }
-                }
-              }
-            }
-        """)
         if filter:
             filter = f"{filter} and preset:no-images and preset:no-styling"
         else:
             filter = "preset:no-images and preset:no-styling"
-        result = self.__client.execute(query, variable_values={"limit": limit, "offset": offset, "filter": filter})
+        result = self._execute(LIST_TRAFFIC, {"limit": limit, "offset": offset, "filter": filter})
         data = result['interceptEntriesByOffset']
         try:
-            toolset.logger.log_observation(data, "http_traffic")
+            from ..logger import logger
+            logger.log_observation(data, "http_traffic")
         except Exception:
             pass
         return data
-    
+
     @tool()
     def view_traffic(self, id: int, b64encode: Annotated[str, "whether the returned traffic needs to be base64 encoded. Generally, not required, so you can view the results directly"]=False) -> dict:
-        query = gql("""
-            query ($id: ID!) {
-              request(id: $id) {
-                id
-                isTls
-                host
-                port
-                raw
-                response {
-                    roundtripTime
-                    raw
-                }
-              }
-            }
-        """)
-        result = self.__client.execute(query, variable_values={"id": str(id)})
+        result = self._execute(VIEW_TRAFFIC, {"id": str(id)})
         if not b64encode and result['request'] and 'raw' in result['request']:
-            result['request']['raw'] = base64.b64decode(result['request']['raw']).decode('utf-8', errors='replace')
+            result['request']['raw'], _ = decode_raw(result['request']['raw'])
             if result['request']['response'] and 'raw' in result['request']['response']:
-                result['request']['response']['raw'] = base64.b64decode(result['request']['response']['raw']).decode('utf-8', errors='replace')
+                result['request']['response']['raw'], _ = decode_raw(result['request']['response']['raw'])
+        try:
+            from ..logger import logger
+            logger.log_observation(result, "http_traffic")
+        except Exception:
+            pass
+        return result
+
+    def _view_chunk(self, ids: list[str]) -> list[dict]:
+        result = self._execute(view_many_document(len(ids)), {f"id{i}": id for i, id in enumerate(ids)})
+        requests = [result.get(f"r{i}") for i in range(len(ids))]
+        for id, request in zip(ids, requests):
+            if request is not None and str(request.get('id')) != id:
+                raise RuntimeError(f"Requested traffic {id} but got {request.get('id')}")
+        return requests
+
+    def _view_lane(self, chunks: list[list[str]]) -> list[list[dict]]:
+        return [self._view_chunk(chunk) for chunk in chunks]
+
+    @tool()
+    def view_traffic_many(self, ids: Annotated[list[int], "request ids, e.g. from list_traffic"]=None, filter: Annotated[str, '''Caido HTTPQL statement selecting the requests instead of ids, such as ' req.path.like:"/api/%" and resp.code.eq:500 ' ''']=None, limit: Annotated[int, "max requests taken from filter, newest first"]=100, max_body_bytes: Annotated[int, "cut each request/response raw to this many bytes, cut ones get 'truncated': True (None: no limit)"]=None, b64encode: Annotated[str, "whether the returned traffic needs to be base64 encoded. Generally, not required"]=False, concurrency: int=4) -> dict:
+        """
+        View many requests with their responses at once, e.g. after a ffuf or sqlmap run. Fetches 50 requests per GraphQL query and runs `concurrency` queries at a time, instead of one round trip per view_traffic call.
+
+        Returns {"count", "requests": [...] in the order of ids, "missing": [ids that do not exist]}.
+
+        Example:
+            ```
+            import toolset
+
+            result = toolset.proxy.view_traffic_many(filter='req.path.like:"/search%"', limit=200, max_body_bytes=2000)
+            for r in result["requests"]:
+                print(r["id"], r["response"]["raw"][:200] if r["response"] else None)
+            ```
+        """
+        if ids is None:
+            if not filter:
+                raise ValueError("Pass ids or filter")
+            ids = []
+            filter = f"{filter} and preset:no-images and preset:no-styling"
+            while len(ids) < limit:
+                page = self._execute(LIST_TRAFFIC, {"limit": min(limit - len(ids), 500), "offset": len(ids), "filter": filter})
+                nodes = page['interceptEntriesByOffset']['nodes']
+                if not nodes:
+                    break
+                ids.extend(node['request']['id'] for node in nodes)
+        ids = list(dict.fromkeys(str(id) for id in ids))
+        chunks = [ids[i:i + VIEW_MANY_BATCH] for i in range(0, len(ids), VIEW_MANY_BATCH)]
+        # `concurrency` lanes, each fetching its chunks one after another: chunk k is at k // lanes in lane k % lanes
+        lanes = max(1, min(concurrency, 8, len(chunks)))
+        futures = [self.__pool.submit(self._view_lane, chunks[lane::lanes]) for lane in range(lanes)]
+        results = [future.result() for future in futures]
+        fetched = [request for k in range(len(chunks)) for request in results[k % lanes][k // lanes]]
+
+        requests, missing = [], []
+        for id, request in zip(ids, fetched):
+            if request is None:
+                missing.append(id)
+                continue
+            for message in (request, request.get('response')):
+                if message and message.get('raw') is not None:
+                    message['raw'], truncated = decode_raw(message['raw'], b64encode, max_body_bytes)
+                    if truncated:
+                        message['truncated'] = True
+            requests.append(request)
+        result = {"count": len(requests), "requests": requests, "missing": missing}
         try:
-            toolset.logger.log_observation(result, "http_traffic")
+            from ..logger import logger
+            logger.log_observation(result, "http_traffic")
         except Exception:
             pass
         return result
 
+    @tool()
+    async def list_traffic_async(self, limit: int=5, offset: int=0, filter: Annotated[str, '''Caido HTTPQL statement, such as ' req.host.like:"%.example.com" and req.method.like:"POST" ' ''']=None) -> dict:
+        """
+        Awaitable list_traffic. It runs in a worker thread, so the kernel's event loop (and any browser automation on it) keeps running.
+
+        Example:
+            ```
+            import toolset
+
+            traffic = await toolset.proxy.list_traffic_async(limit=20, filter='req.method.like:"POST"')
+            ```
+        """
+        return await asyncio.to_thread(self.list_traffic, limit, offset, filter)
+
+    @tool()
+    async def view_traffic_async(self, id: int, b64encode: Annotated[str, "whether the returned traffic needs to be base64 encoded. Generally, not required, so you can view the results directly"]=False) -> dict:
+        """
+        Awaitable view_traffic. Several calls can be run at once with asyncio.gather.
+
+        Example:
+            ```
+            import asyncio
+            import toolset
+
+            entries = await asyncio.gather(*(toolset.proxy.view_traffic_async(i) for i in (12, 13, 14)))
+            ```
+        """
+        return await asyncio.to_thread(self.view_traffic, id, b64encode)
+
+    @tool()
+    async def view_traffic_many_async(self, ids: list[int]=None, filter: str=None, limit: int=100, max_body_bytes: int=None, b64encode: bool=False, concurrency: int=4) -> dict:
+        """
+        Awaitable view_traffic_many.
+
+        Example:
+            ```
+            import toolset
+
+            result = await toolset.proxy.view_traffic_many_async(ids=[101, 102, 103], max_body_bytes=4096)
+            ```
+        """
+        return await asyncio.to_thread(self.view_traffic_many, ids, filter, limit, max_body_bytes, b64encode, concurrency)
+
 
 
 if __name__ == "__main__":
     from . import proxy
-    proxy.list_traffic()
\ No newline at end of file
+    proxy.list_traffic()
@@ -61,14 +61,16 @@ class Terminal:
         if not sessions:
             output = f"No session found with id: {session_id}. Here are session ids: {', '.join(session_ids)}"
             try:
-                toolset.logger.log_observation(output, "terminal")
+                from ..logger import logger
+                logger.log_observation(output, "terminal")
             except Exception:
                 pass
             return output
         session = sessions[0]
         output = '\n'.join(session.windows[0].panes[0].capture_pane(start, end))
         try:
-            toolset.logger.log_observation(output, "terminal")
+            from ..logger import logger
+            logger.log_observation(output, "terminal")
         except Exception:
             pass
         return output
@@ -117,7 +119,8 @@ class Terminal:
         time.sleep(1)
         output = '\n'.join(session.windows[0].panes[0].capture_pane())
         try:
-            toolset.logger.log_observation(output, "terminal")
+            from ..logger import logger
+            logger.log_observation(output, "terminal")
         except Exception:
             pass
         return output
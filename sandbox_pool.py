@@ -0,0 +1,124 @@
+"""
+Warm sandbox pool: keep `size` sandboxes booted and health-checked so a challenge starts in
+about a second instead of waiting for entrypoint.sh (VNC, Caido, Chrome, MCP server...).
+
+Sandboxes are single use. Each one boots with its own slot directory as workspace. After the
+run the container is removed and the slot directory is moved to the task's workspace, which
+resets the environment without any in-container cleanup logic. Taking a sandbox triggers a
+background replacement.
+"""
+
+import os
+import uuid
+import shutil
+import threading
+from collections import deque
+
+from tinyctfer import Ctfer
+
+
+class SandboxPool:
+    def __init__(self, size, root, ready_timeout=180, ctfer_factory=None):
+        self.size = size
+        self.root = os.path.join(root, ".pool")
+        self.ready_timeout = ready_timeout
+        self.ctfer_factory = ctfer_factory or (lambda workspace: Ctfer(None, workspace))
+        self._ready = deque()
+        self._starting = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def _new_sandbox(self):
+        workspace = os.path.join(self.root, f"slot-{uuid.uuid4().hex[:12]}")
+        os.makedirs(workspace, exist_ok=True)  # created by us, not by dockerd as root
+        try:
+            ctfer = self.ctfer_factory(workspace)
+        except BaseException:
+            shutil.rmtree(workspace, ignore_errors=True)
+            raise
+        if not ctfer.wait_ready(self.ready_timeout):
+            ctfer.remove()
+            shutil.rmtree(workspace, ignore_errors=True)
+            raise RuntimeError(f"Sandbox did not become ready within {self.ready_timeout}s")
+        return ctfer
+
+    def _fill_one(self):
+        try:
+            ctfer = self._new_sandbox()
+        except BaseException as e:
+            print(f"[!] Warm sandbox failed to start: {e}")
+            ctfer = None
+        with self._cond:
+            self._starting -= 1
+            closed = self._closed
+            if ctfer is not None and not closed:
+                self._ready.append(ctfer)
+            self._cond.notify_all()
+        if ctfer is not None and closed:
+            self._discard(ctfer)
+
+    def refill(self):
+        """Start sandboxes in background threads until ready + starting reaches `size`."""
+        with self._cond:
+            missing = 0 if self._closed else self.size - len(self._ready) - self._starting
+            self._starting += max(missing, 0)
+        for _ in range(max(missing, 0)):
+            threading.Thread(target=self._fill_one, daemon=True).start()
+
+    def acquire(self, timeout=None):
+        """
+        Return a ready Ctfer. Waits for a sandbox that is already booting; if none is ready or
+        starting (pool size 0, or boots failing) one is started on the spot.
+        """
+        ctfer = None
+        while ctfer is None:
+            with self._cond:
+                while not self._ready and self._starting and not self._closed:
+                    if not self._cond.wait(timeout):
+                        break
+                candidate = self._ready.popleft() if self._ready else None
+            if candidate is None:
+                break
+            if candidate.is_ready():
+                ctfer = candidate
+            else:
+                self._discard(candidate)  # died while waiting in the pool
+        self.refill()
+        return ctfer if ctfer is not None else self._new_sandbox()
+
+    def release(self, ctfer, workspace):
+        """Remove the used sandbox and move its slot directory's contents to `workspace`."""
+        ctfer.remove()
+        os.makedirs(workspace, exist_ok=True)
+        for name in os.listdir(ctfer.workspace):
+            target = os.path.join(workspace, name)
+            if os.path.isdir(target) and not os.path.islink(target):
+                shutil.rmtree(target)
+            elif os.path.lexists(target):
+                os.remove(target)
+            shutil.move(os.path.join(ctfer.workspace, name), target)
+        os.rmdir(ctfer.workspace)
+
+    def evict(self):
+        """Remove one idle sandbox, freeing its cores for other work; returns whether there was one."""
+        with self._cond:
+            ctfer = self._ready.popleft() if self._ready else None
+        if ctfer is None:
+            return False
+        self._discard(ctfer)
+        return True
+
+    def _discard(self, ctfer):
+        ctfer.remove()
+        shutil.rmtree(ctfer.workspace, ignore_errors=True)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            ready, self._ready = list(self._ready), deque()
+            self._cond.notify_all()
+        for ctfer in ready:
+            self._discard(ctfer)
+        # sandboxes still booting are discarded by _fill_one, don't exit and orphan them
+        with self._cond:
+            self._cond.wait_for(lambda: self._starting == 0, self.ready_timeout)
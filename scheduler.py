@@ -0,0 +1,238 @@
+"""
+Scheduler mode of tinyctfer.py: solve a list of challenges across several sandboxes at once.
+
+Challenges file: JSONL (one object per line) or YAML (a list, or {"challenges": [...]}):
+
+    {"id": "xxe", "ctf": "http://10.0.0.5:81 BUU XXE COURSE 1", "priority": 10, "budget": 1800, "retries": 1}
+
+Only "ctf" is required; "cpus", "mem" and "pids_limit" override the resource profile ("cpus": 0
+means no CPU limit). Warm pool sandboxes are booted with the default profile, so a challenge
+with its own limits gets a fresh sandbox instead of a pooled one; while it waits for cores,
+idle warm sandboxes are removed to free theirs.
+Higher priority starts first, ties keep file order. An unsolved or failed attempt is queued
+again until its retries are used up. An attempt that failed because its Docker host went
+down is queued again as the same attempt and lands on another host. Each challenge's final
+outcome is appended to the results JSONL as soon as it is known.
+"""
+
+import os
+import re
+import json
+import time
+import queue
+import threading
+
+from tinyctfer import FLAG_REGEX, Ctfer, PortAllocator, ResourceProfile, cleanup_session, latest_log, solve
+from sandbox_pool import SandboxPool
+
+
+def load_challenges(path):
+    with open(path, encoding="utf-8") as f:
+        if path.endswith((".yaml", ".yml")):
+            try:
+                import yaml
+            except ImportError:
+                raise SystemExit("[-] YAML challenge files need PyYAML: uv run --with pyyaml tinyctfer.py ...")
+            data = yaml.safe_load(f) or []
+            challenges = data.get("challenges", []) if isinstance(data, dict) else data
+        else:
+            challenges = [json.loads(line) for line in f if line.strip()]
+
+    seen = set()
+    for i, challenge in enumerate(challenges):
+        if not challenge.get("ctf"):
+            raise SystemExit(f"[-] Challenge #{i + 1} in {path} has no 'ctf'")
+        challenge.setdefault("id", f"challenge-{i + 1}")
+        challenge["id"] = re.sub(r"[^\w\-.]", "_", str(challenge["id"]))
+        if challenge["id"] in seen:
+            raise SystemExit(f"[-] Duplicate challenge id '{challenge['id']}' in {path}")
+        seen.add(challenge["id"])
+    return challenges
+
+
+class Scheduler:
+    def __init__(self, challenges, workspace, concurrency=4, vnc_base_port=5901, budget=None,
+                 retries=0, flag_regex=FLAG_REGEX, results_path=None, warm_pool=0, profile=None, placer=None,
+                 backend=None, solve=solve):
+        self.challenges = challenges
+        self.workspace = workspace
+        self.concurrency = max(1, concurrency)
+        # VNC host ports from vnc_base_port on; 0 lets Docker pick ephemeral ports
+        self.ports = PortAllocator(vnc_base_port, vnc_base_port + 1000) if vnc_base_port else None
+        self.budget = budget
+        self.retries = retries
+        self.flag_regex = flag_regex
+        self.results_path = results_path or os.path.join(workspace, "results.jsonl")
+        self.solve = solve
+        self.profile = profile or ResourceProfile()
+        self.placer = placer  # CorePlacer: pins sandboxes to cores and holds attempts back when the host is full
+        self.backend = backend  # DockerBackend: spreads sandboxes over several Docker hosts instead
+        # pre-booted sandboxes, used instead of starting one per attempt when warm_pool > 0
+        self.pool = SandboxPool(warm_pool, workspace, ctfer_factory=self._start_pooled) if warm_pool > 0 else None
+        # (-priority, file order, attempt); the order keeps retries behind fresh challenges of the same priority
+        self._queue = queue.PriorityQueue()
+        self._order = 0
+        self._pending = len(challenges)
+        self._lock = threading.Lock()
+        self.results = {}
+
+    def _push(self, challenge, attempt):
+        with self._lock:
+            self._order += 1
+            self._queue.put((-challenge.get("priority", 0), self._order, attempt, challenge))
+
+    def _profile(self, challenge):
+        return ResourceProfile(
+            challenge.get("cpus", self.profile.cpus),
+            challenge.get("mem", self.profile.mem_limit),
+            challenge.get("pids_limit", self.profile.pids_limit),
+        )
+
+    def _custom_limits(self, challenge):
+        profile = self._profile(challenge)
+        return (profile.cpus, profile.mem_limit, profile.pids_limit) != \
+            (self.profile.cpus, self.profile.mem_limit, self.profile.pids_limit)
+
+    def _place(self, profile, timeout=None):
+        if self.backend:
+            return self.backend.place(profile, timeout)
+        return self.placer.place(profile, timeout) if self.placer else profile
+
+    def _place_custom(self, profile):
+        """Place a profile that bypasses the pool; idle warm sandboxes are removed while it waits for their cores."""
+        while True:
+            try:
+                return self._place(profile, None if self.pool is None else 5)
+            except TimeoutError:
+                self.pool.evict()
+
+    def _release(self, placement):
+        if self.placer or self.backend:
+            placement.release()
+
+    def _host_failed(self, placement):
+        host = getattr(placement, "host", None)
+        return bool(host) and not self.backend.check(host)
+
+    def _start_pooled(self, workspace):
+        placement = self._place(self.profile)
+        try:
+            return Ctfer(None, workspace, placement=placement)
+        except BaseException:
+            self._release(placement)
+            if self._host_failed(placement):
+                return self._start_pooled(workspace)  # the host died, boot on another one
+            raise
+
+    def _attempt(self, challenge, attempt):
+        workspace = os.path.join(self.workspace, challenge["id"], f"attempt-{attempt}")
+        os.makedirs(workspace, exist_ok=True)
+        budget = challenge.get("budget", self.budget)
+        started = time.monotonic()
+        placement = None
+        try:
+            if self.pool and not self._custom_limits(challenge):
+                ctfer = self.pool.acquire()
+                placement = ctfer.placement
+                try:
+                    result = self.solve(challenge["ctf"], ctfer.workspace, None, budget, self.flag_regex,
+                                        ctfer=ctfer, echo=False)
+                finally:
+                    self.pool.release(ctfer, workspace)
+                result["log_path"] = latest_log(workspace)
+            else:
+                placement = self._place_custom(self._profile(challenge))
+                # the allocator only knows this machine's ports, remote hosts pick their own
+                local = getattr(placement, "host", None) is None or placement.host.url is None
+                vnc_port = self.ports.acquire() if self.ports and local else None
+                try:
+                    result = self.solve(challenge["ctf"], workspace, vnc_port, budget, self.flag_regex,
+                                        echo=False, placement=placement)
+                finally:
+                    if vnc_port:
+                        self.ports.release(vnc_port)
+                    self._release(placement)  # normally done by Ctfer.cleanup(), unless it failed to start
+        except BaseException as e:  # Ctfer exits on a missing image, keep the worker alive
+            result = {"status": "error", "flag": None, "log_path": None, "output": "",
+                      "error": f"{type(e).__name__}: {e}"}
+            result["host_failed"] = self._host_failed(placement)
+        if getattr(placement, "host", None):
+            result["host"] = placement.host.name
+        result.setdefault("duration", round(time.monotonic() - started, 1))
+        result["workspace"] = workspace  # the agent's output is in <workspace>/agent_output.log
+        return result
+
+    def _record(self, challenge, attempt, result):
+        record = {
+            "id": challenge["id"],
+            "ctf": challenge["ctf"],
+            "status": result["status"],
+            "flag": result.get("flag"),
+            "duration": result["duration"],
+            "attempts": attempt,
+            "log_path": result.get("log_path"),
+            "workspace": result["workspace"],
+            "vnc_port": result.get("vnc_port"),
+        }
+        if result.get("host"):
+            record["host"] = result["host"]
+        if result.get("error"):
+            record["error"] = result["error"]
+        with self._lock:
+            self.results[challenge["id"]] = record
+            with open(self.results_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._pending -= 1
+            if self._pending == 0:
+                for _ in range(self.concurrency):
+                    self._queue.put((float("inf"), 0, 0, None))  # wake idle workers so they exit
+        print(f"[+] {challenge['id']}: {record['status']} {record['flag'] or ''} ({record['duration']}s, attempt {attempt})")
+
+    def _worker(self, slot):
+        while True:
+            _, _, attempt, challenge = self._queue.get()
+            if challenge is None:
+                return
+            print(f"[+] [slot {slot}] {challenge['id']} attempt {attempt}")
+            result = self._attempt(challenge, attempt)
+            retries = challenge.get("retries", self.retries)
+            if result.get("host_failed"):
+                print(f"[!] {challenge['id']}: host {result.get('host')} failed, rescheduling attempt {attempt}")
+                self._push(challenge, attempt)
+            elif result["status"] != "solved" and attempt <= retries:
+                self._push(challenge, attempt + 1)
+            else:
+                self._record(challenge, attempt, result)
+
+    def run(self):
+        """Solve every challenge and return {id: result record}."""
+        os.makedirs(self.workspace, exist_ok=True)
+        os.makedirs(os.path.dirname(os.path.abspath(self.results_path)), exist_ok=True)
+        open(self.results_path, "w").close()
+        if not self.challenges:
+            return self.results
+        if self.pool:
+            self.pool.refill()
+        for challenge in self.challenges:
+            self._push(challenge, 1)
+        workers = [threading.Thread(target=self._worker, args=(slot,), daemon=True)
+                   for slot in range(min(self.concurrency, len(self.challenges)))]
+        try:
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+        finally:
+            if self.pool:
+                self.pool.close()
+            clients = [host.client for host in self.backend.hosts if host.healthy] if self.backend else [None]
+            for client in clients:
+                try:
+                    cleanup_session(docker_client=client)  # stopped sandboxes of this run, found by label
+                except Exception as e:
+                    print(f"[!] Could not remove sandboxes: {e}")
+        solved = sum(r["status"] == "solved" for r in self.results.values())
+        candidates = sum(r["status"] == "candidate" for r in self.results.values())
+        print(f"[+] 完成 {solved}/{len(self.challenges)}" + (f", 疑似flag待确认 {candidates}" if candidates else "")
+              + f", 结果: {self.results_path}")
+        return self.results
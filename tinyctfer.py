@@ -19,8 +19,20 @@ References:
 """
 
 import os
+import re
+import sys
+import glob
+import gzip
+import json
+import math
+import time
+import uuid
+import codecs
+import socket
+import threading
 import argparse
 from pathlib import Path
+from urllib.parse import urlparse
 import docker
 from docker.models.containers import Container
 from docker.errors import ImageNotFound
@@ -29,9 +41,284 @@ from docker.errors import ImageNotFound
 SCRIPT_DIR = Path(__file__).resolve().parent
 print(SCRIPT_DIR)
 
+# Every sandbox is labelled, so finding ours never means inspecting every container on the host
+LABEL = "tinyctfer"
+SESSION_ID = uuid.uuid4().hex[:12]  # this launcher process, see cleanup_session()
+
+
+def _port_free(port):
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        try:
+            sock.bind(("0.0.0.0", port))
+            return True
+        except OSError:
+            return False
+
+
+class PortAllocator:
+    """Hands out host ports from [start, end) to concurrent runs of this process, skipping busy ones."""
+    def __init__(self, start=5901, end=6901):
+        self.start = start
+        self.end = end
+        self._used = set()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            for port in range(self.start, self.end):
+                if port not in self._used and _port_free(port):
+                    self._used.add(port)
+                    return port
+        raise RuntimeError(f"No free port in {self.start}-{self.end - 1}")
+
+    def release(self, port):
+        with self._lock:
+            self._used.discard(port)
+
+
+def cleanup_session(session_id=SESSION_ID, docker_client=None):
+    """Remove every container started by a launcher process (default: this one), in O(1) list calls."""
+    docker_client = docker_client or docker.DockerClient()
+    for container in docker_client.containers.list(all=True, filters={"label": f"{LABEL}.session={session_id}"}):
+        try:
+            container.remove(force=True)
+        except Exception:
+            continue
+
+
+class ResourceProfile:
+    """CPU, memory and process limits of one sandbox; 0/None leaves a limit off."""
+    def __init__(self, cpus=0, mem_limit=None, pids_limit=None):
+        self.cpus = cpus
+        self.mem_limit = mem_limit
+        self.pids_limit = pids_limit
+
+    def container_kwargs(self, cores=None):
+        kwargs = {
+            "nano_cpus": int(self.cpus * 1e9) if self.cpus else None,
+            "mem_limit": self.mem_limit,
+            "memswap_limit": self.mem_limit,  # no swap on top, a runaway sandbox hits the limit instead
+            "pids_limit": self.pids_limit,
+            "cpuset_cpus": ",".join(map(str, cores)) if cores else None,
+        }
+        return {k: v for k, v in kwargs.items() if v}
+
+
+class Placement:
+    """
+    A profile pinned to host cores by CorePlacer, or to a Docker host by DockerBackend;
+    release() gives the capacity back (idempotent).
+    """
+    def __init__(self, profile, cores=None, share=0.0, placer=None, host=None):
+        self.profile = profile
+        self.cores = cores or []
+        self.share = share
+        self.host = host  # DockerHost the sandbox runs on, None for the local daemon
+        self._placer = placer
+
+    def container_kwargs(self):
+        return self.profile.container_kwargs(self.cores)
+
+    def release(self):
+        placer, self._placer = self._placer, None
+        if placer:
+            placer.release(self)
+
+
+class CorePlacer:
+    """
+    Pins sandboxes to the least loaded host cores. A profile with `cpus` = c takes ceil(c)
+    cores with c/ceil(c) load each. Nothing is placed that would push a core past `overcommit`
+    (1.0 = one full core's worth per core); place() waits for capacity instead. A profile
+    without a CPU limit (cpus 0) is neither pinned nor counted.
+    """
+    def __init__(self, cores=None, overcommit=1.0):
+        if cores is None:
+            cores = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else range(os.cpu_count() or 1)
+        self.load = {core: 0.0 for core in cores}
+        self.overcommit = overcommit
+        self._cond = threading.Condition()
+
+    def _try_place(self, profile):
+        if not profile.cpus:
+            return Placement(profile, placer=self)
+        count = max(1, math.ceil(profile.cpus))
+        if count > len(self.load):
+            raise ValueError(f"Profile needs {count} cores, host has {len(self.load)}")
+        share = profile.cpus / count
+        cores = sorted(self.load, key=lambda core: (self.load[core], core))[:count]
+        if any(self.load[core] + share > self.overcommit + 1e-9 for core in cores):
+            return None
+        for core in cores:
+            self.load[core] += share
+        return Placement(profile, sorted(cores), share, self)
+
+    def place(self, profile, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while (placement := self._try_place(profile)) is None:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError(f"No capacity for {profile.cpus} CPUs within {timeout}s")
+                self._cond.wait(remaining)
+            return placement
+
+    def release(self, placement):
+        with self._cond:
+            for core in placement.cores:
+                self.load[core] = max(self.load[core] - placement.share, 0.0)
+            self._cond.notify_all()
+
+
+class DockerHost:
+    """
+    One Docker endpoint (None = the local daemon). Capacity is the CPU count the daemon reports;
+    load is the CPUs placed on it, counting a sandbox without a CPU limit as one. A host that
+    can't be reached starts unhealthy with unknown capacity, connect() is retried by the backend.
+    """
+    def __init__(self, url=None, client_factory=None, overcommit=1.0, pin_cores=False):
+        self.url = url
+        self.name = url or "local"
+        self.client_factory = client_factory or docker.DockerClient
+        self.overcommit = overcommit
+        self.pin_cores = pin_cores
+        self.client = None
+        self.capacity = None
+        self.limit = 0
+        self.placer = None
+        self.load = 0.0
+        self.sandboxes = 0
+        self.healthy = False
+        self.checked = time.monotonic()
+        self.connect()
+
+    def connect(self):
+        """Create the client and read the capacity; returns whether the host is reachable."""
+        try:
+            if self.client is None:
+                self.client = self.client_factory(base_url=self.url) if self.url else self.client_factory()
+            capacity = self.client.info().get("NCPU") or 1
+        except Exception as e:
+            print(f"[!] Docker host {self.name} is unreachable: {e}")
+            return False
+        if capacity != self.capacity:
+            self.capacity = capacity
+            self.limit = capacity * self.overcommit
+            # cores are pinned per host, the core ids are the remote machine's
+            self.placer = CorePlacer(range(capacity), self.overcommit) if self.pin_cores else None
+        self.healthy = True
+        return True
+
+    def ping(self):
+        if self.client is None:
+            return self.connect()
+        try:
+            self.client.ping()
+            return True
+        except Exception:
+            return False
+
+
+class DockerBackend:
+    """
+    Spreads sandboxes over several Docker hosts. place() puts a profile on the healthy host with
+    the lowest load/capacity that still has room, waiting while all of them are full, and raises
+    once none is healthy or the profile is larger than every healthy host. A host found dead by
+    check() takes no new sandboxes; it is probed again every `recheck` seconds and comes back
+    when it answers.
+
+    The sandbox mounts this checkout and the workspace by host path, so remote hosts need both
+    at the same path (shared filesystem).
+    """
+    def __init__(self, endpoints=None, client_factory=None, overcommit=1.0, pin_cores=False, recheck=30):
+        self.hosts = [DockerHost(url, client_factory, overcommit, pin_cores) for url in endpoints or [None]]
+        self.recheck = recheck
+        self._cond = threading.Condition()
+
+    def _probe(self):
+        now = time.monotonic()
+        for host in self.hosts:
+            if not host.healthy and now - host.checked >= self.recheck:
+                host.checked = now
+                if host.capacity is None or host.sandboxes == 0:
+                    up = host.connect()  # nothing placed there, the capacity can be (re)read
+                else:
+                    up = host.ping()
+                if up:
+                    print(f"[+] Docker host {host.name} is back")
+                    host.healthy = True
+
+    def _fits(self, host, profile):
+        """Whether `profile` fits on `host` when nothing else runs there."""
+        need = profile.cpus or 1
+        if host.placer and profile.cpus and math.ceil(need) > host.capacity:
+            return False
+        return need <= host.limit + 1e-9
+
+    def _try_place(self, profile):
+        need = profile.cpus or 1
+        for host in sorted((h for h in self.hosts if h.healthy), key=lambda h: (h.load / h.capacity, h.sandboxes)):
+            if host.load + need > host.limit + 1e-9:
+                continue
+            cores, share = [], 0.0
+            if host.placer and profile.cpus:
+                if math.ceil(need) > host.capacity:
+                    continue
+                pinned = host.placer._try_place(profile)
+                if pinned is None:
+                    continue
+                cores, share = pinned.cores, pinned.share
+            host.load += need
+            host.sandboxes += 1
+            return Placement(profile, cores, share, self, host)
+        return None
+
+    def place(self, profile, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                self._probe()
+                healthy = [host for host in self.hosts if host.healthy]
+                if not healthy:
+                    raise RuntimeError("No healthy Docker host")
+                if not any(self._fits(host, profile) for host in healthy):
+                    raise ValueError(f"Profile needs {profile.cpus} CPUs, more than any healthy Docker host has")
+                placement = self._try_place(profile)
+                if placement is not None:
+                    return placement
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError(f"No Docker host has capacity for {profile.cpus} CPUs within {timeout}s")
+                self._cond.wait(self.recheck if remaining is None else min(remaining, self.recheck))
+
+    def release(self, placement):
+        host = placement.host
+        with self._cond:
+            host.load = max(host.load - (placement.profile.cpus or 1), 0.0)
+            host.sandboxes -= 1
+            if host.placer:
+                host.placer.release(placement)
+            self._cond.notify_all()
+
+    def check(self, host):
+        """Probe `host` after a failed run; a dead host is taken out of placement. Returns whether it is up."""
+        if host.ping():
+            return True
+        with self._cond:
+            if host.healthy:
+                print(f"[!] Docker host {host.name} is down, not placing sandboxes there")
+            host.healthy = False
+            host.checked = time.monotonic()
+        return False
+
+    def status(self):
+        return [{"host": h.name, "healthy": h.healthy, "capacity": h.capacity, "load": h.load,
+                 "sandboxes": h.sandboxes} for h in self.hosts]
+
+
 class Ctfer:
     """CTF Solver Runtime - Provide AI maximum freedom within safe container boundary"""
-    def __init__(self, vnc_port, workspace):
+    def __init__(self, vnc_port, workspace, labels=None, placement=None, docker_client=None):
         # Sandbox: Ubuntu desktop + Claude Code + Python Executor MCP + Toolset + Security tools
         self.image = "l3yx/sandbox:latest"
         self.volumes = [
@@ -48,10 +335,28 @@ class Ctfer:
             "NO_CODESERVER": "true",
             # hint for logger where workspace lives (inside container)
             "WORKSPACE_DIR": "/home/ubuntu/Workspace",
+            # shared logger service started by entrypoint.sh, used by every process in the sandbox
+            "PENTEST_LOGGER_SOCKET": "/tmp/penetration_logger.sock",
+        }
+        # VNC for human observation; None lets Docker pick a free host port (see self.vnc_port)
+        self.ports = {"5901/tcp": vnc_port}
+        self.vnc_port = vnc_port
+        self.workspace = workspace
+        self.run_id = uuid.uuid4().hex[:12]
+        self.labels = {
+            f"{LABEL}.session": SESSION_ID,
+            f"{LABEL}.run": self.run_id,
+            f"{LABEL}.workspace": str(workspace),
+            f"{LABEL}.vnc_port": str(vnc_port or "auto"),
+            **(labels or {}),
         }
-        self.ports = {f"{vnc_port}":"5901"}  # VNC for human observation
+        # Placement (pinned cores) or a bare ResourceProfile; released again in cleanup()
+        self.placement = placement
+        self.resources = placement.container_kwargs() if placement else {}
+        host = getattr(placement, "host", None)
         try:
-            self.docker_client = docker.DockerClient()
+            # the client of the host DockerBackend placed the sandbox on, else the local daemon
+            self.docker_client = docker_client or (host.client if host else docker.DockerClient())
         except Exception as e:
             print(f"[-] Failed to connect to Docker: {e}")
             print("[-] Please ensure Docker is running and you have permission to access it.")
@@ -68,15 +373,17 @@ class Ctfer:
             raise
         
         # Check and clean up containers using the same port
-        self._cleanup_port_conflicts(vnc_port)
+        if vnc_port:
+            self._cleanup_port_conflicts(vnc_port)
         
         try:
             self.container:Container = self.docker_client.containers.run(
                 image=self.image, volumes=self.volumes, environment=self.environment,
-                ports=self.ports, detach=True, remove=False,
+                ports=self.ports, labels=self.labels, detach=True, remove=False, **self.resources,
             )
             check = self.container.exec_run("bash -c 'id && pwd'")
             print(check.output)
+            self._read_vnc_port()
         except Exception as e:
             error_msg = str(e)
             if "port is already allocated" in error_msg or "address already in use" in error_msg.lower():
@@ -86,10 +393,11 @@ class Ctfer:
                 try:
                     self.container:Container = self.docker_client.containers.run(
                         image=self.image, volumes=self.volumes, environment=self.environment,
-                        ports=self.ports, detach=True, remove=False,
+                        ports=self.ports, labels=self.labels, detach=True, remove=False, **self.resources,
                     )
                     check = self.container.exec_run("bash -c 'id && pwd'")
                     print(check.output)
+                    self._read_vnc_port()
                     print(f"[+] Container started successfully after cleanup")
                 except Exception as retry_e:
                     print(f"[-] Failed to start container after cleanup: {retry_e}")
@@ -100,27 +408,47 @@ class Ctfer:
                 print(f"[-] Failed to start container: {e}")
                 raise
     
+    def _read_vnc_port(self):
+        if self.vnc_port:
+            return
+        self.container.reload()
+        bindings = self.container.attrs['NetworkSettings']['Ports'].get('5901/tcp') or []
+        self.vnc_port = int(bindings[0]['HostPort']) if bindings else None
+
+    def is_ready(self):
+        """Health check: container running and the MCP server inside answering."""
+        try:
+            self.container.reload()
+            if self.container.status != "running":
+                return False
+            check = self.container.exec_run(["curl", "-s", "-o", "/dev/null", "--max-time", "2", "http://localhost:8000/"])
+            return check.exit_code == 0
+        except Exception:
+            return False
+
+    def wait_ready(self, timeout=180, interval=0.5):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.is_ready():
+                return True
+            time.sleep(interval)
+        return False
+
     def _cleanup_port_conflicts(self, port, force=False):
-        """Stop containers that are using the specified port."""
+        """Stop sandboxes of earlier runs that were given the specified port (found by label, not by scanning)."""
         try:
-            containers = self.docker_client.containers.list(all=True)
+            containers = self.docker_client.containers.list(all=True, filters={"label": f"{LABEL}.vnc_port={port}"})
             for container in containers:
-                try:
-                    port_mappings = container.attrs.get('NetworkSettings', {}).get('Ports', {})
-                    for container_port, host_bindings in port_mappings.items():
-                        if host_bindings:
-                            for binding in host_bindings:
-                                if binding.get('HostPort') == str(port):
-                                    print(f"[!] Found container {container.id[:12]} using port {port}")
-                                    if force:
-                                        print(f"[!] Stopping container {container.id[:12]}...")
-                                        container.stop(timeout=5)
-                                        container.remove()
-                                        print(f"[+] Container {container.id[:12]} stopped and removed")
-                                    return
-                except Exception:
-                    # Skip containers that can't be inspected
-                    continue
+                if container.labels.get(f"{LABEL}.session") == SESSION_ID:
+                    continue  # a concurrent run of this process, the allocator already keeps us apart
+                print(f"[!] Found container {container.id[:12]} using port {port}")
+                if force:
+                    try:
+                        print(f"[!] Stopping container {container.id[:12]}...")
+                        container.remove(force=True)
+                        print(f"[+] Container {container.id[:12]} stopped and removed")
+                    except Exception:
+                        continue
         except Exception as e:
             if force:
                 print(f"[!] Warning: Could not check for port conflicts: {e}")
@@ -131,6 +459,17 @@ class Ctfer:
                 self.container.stop(timeout=5)
             except Exception:
                 pass
+        if isinstance(getattr(self, 'placement', None), Placement):
+            self.placement.release()
+
+    def remove(self):
+        self.cleanup()
+        if self.container:
+            try:
+                self.container.remove(force=True)
+            except Exception:
+                pass
+            self.container = None
 
     def __del__(self):
         try:
@@ -138,19 +477,14 @@ class Ctfer:
         except Exception:
             pass
 
-if __name__ == "__main__":
-    # Main Entry Point: The 100-line Baby Runtime in Action
-    parser = argparse.ArgumentParser(description='CTF Challenge Solver')
-    parser.add_argument('--ctf', type=str, required=True, help='CTF challenge URL')
-    parser.add_argument('--vnc-port', type=int, default=5901, help='VNC port (default: 5901)')
-    parser.add_argument('--workspace', type=str, default="workspace", help='Workspace directory (default: workspace)')
+# Flags in competition are usually flag{...}; override with --flag-regex
+FLAG_REGEX = r"(?:flag|ctf)\{[^}\s]{1,200}\}"
+# format examples such as flag{...}, flag{xxx}, flag{example}: never the real flag
+PLACEHOLDER_FLAG = re.compile(r"[.x*…]+|example|test", re.IGNORECASE)
 
-    args = parser.parse_args()
-    ctf = args.ctf
-    vnc_port = args.vnc_port
-    workspace = os.path.abspath(args.workspace)
 
-    task = f'''
+def build_task(ctf):
+    return f'''
     Use the security-ctf-agent: Solve the CTF challenge (obtaining the Flag completes the task, you can end work immediately, don't need to verify the flag's accuracy.)
 
     Challenge Information:
@@ -159,17 +493,10 @@ if __name__ == "__main__":
     **You don't need to scan ports or IP segments, all IP and ports needed for solving are already listed**
     '''.strip()
 
-    print("[+] 启动沙盒...")
-    ctfer = Ctfer(vnc_port, workspace)
-    print("[+] 等待沙盒环境和mcp服务就绪...")
-    ctfer.container.exec_run(["bash","wait.sh"], workdir="/opt/claude_code")
-    print("[+] mcp服务已就绪...")
-    print(f"[+] 可以连接 vnc://127.0.0.1:{vnc_port} 查看可视化界面, 密码123456")
-    print(f"[+] 开始解题, 可以打开 {workspace} 查看解题步骤")
-    print(f"[+] 输入提示词：{task}")
-
-    # Initialize structured log inside sandbox before starting Claude
-    init_script = f"""import os
+
+def build_init_script(task):
+    """Python run inside the sandbox before Claude starts: creates logs/ and records the initial prompt."""
+    return f"""import os
 import sys
 
 # Ensure logs directory exists even if toolset import fails
@@ -244,11 +571,13 @@ except Exception as e:
     except: pass
     # Directory already created above as fallback
 """
+
+
+def init_logger(ctfer, task):
     # Try python3 first, fallback to python
-    logger_init_success = False
     for python_cmd in ["python3", "python"]:
         result = ctfer.container.exec_run(
-            [python_cmd, "-c", init_script],
+            [python_cmd, "-c", build_init_script(task)],
             workdir="/home/ubuntu/Workspace",
             environment={"WORKSPACE_DIR": "/home/ubuntu/Workspace"},  # Explicitly set env
         )
@@ -256,19 +585,300 @@ except Exception as e:
         if result.exit_code == 0:
             if output:
                 print(f"[+] Logger init output: {output}")
-            logger_init_success = True
-            break
-        else:
-            print(f"[!] Logger init failed with {python_cmd}: {output}")
-            if python_cmd == "python":
-                # Both failed, show error
-                print("[!] Failed to initialize logger with both python3 and python")
-
-    print(ctfer.container.logs().decode('utf-8'))
-    #res = ctfer.container.exec_run(["claude", "--dangerously-skip-permissions", "--print", task], workdir="/home/ubuntu/Workspace")
-    res = ctfer.container.exec_run(["claude", "--dangerously-skip-permissions", "--print", task], workdir="/opt/claude_code")
-
-    # Best-effort: let agent log final report via logger tools; nothing to do here explicitly
-    ctfer.cleanup()
-    print("[+] 结束运行")
-    print(bytes.decode(res.output))
+            return True
+        print(f"[!] Logger init failed with {python_cmd}: {output}")
+    # Both failed, show error
+    print("[!] Failed to initialize logger with both python3 and python")
+    return False
+
+
+def latest_log(workspace):
+    """Host path of the newest structured log written by the sandbox logger, if any."""
+    logs = glob.glob(os.path.join(workspace, "logs", "penetration_log_*.json*"))
+    if not logs:
+        return None
+    newest = max(logs, key=os.path.getmtime)
+    # the compacted JSON document rather than its raw journal, once compact_log() wrote it
+    compacted = os.path.splitext(newest)[0] + ".json"
+    return compacted if os.path.exists(compacted) else newest
+
+
+# Asks the sandbox's logger service to write penetration_log_*.json from its journal. Speaks
+# the service's socket protocol directly, importing toolset would load every tool.
+COMPACT_LOG_SCRIPT = """
+import json, os, socket
+sock = socket.socket(socket.AF_UNIX)
+sock.settimeout(30)
+sock.connect(os.getenv("PENTEST_LOGGER_SOCKET", "/tmp/penetration_logger.sock"))
+sock.sendall(b'{"op": "compact", "id": 1}\\n')
+print(sock.makefile().readline())
+"""
+
+
+def compact_log(ctfer):
+    """
+    Compact the structured log before the sandbox stops. The service only does it on its own
+    SIGTERM or on set_final_report, and neither happens when the container is stopped or the
+    agent is killed once the flag shows up.
+    """
+    try:
+        result = ctfer.container.exec_run(["python3", "-c", COMPACT_LOG_SCRIPT])
+        output = result.output.decode("utf-8", errors="replace").strip()
+        if result.exit_code != 0:
+            print(f"[!] Could not compact the log: {output.splitlines()[-1] if output else result.exit_code}")
+        elif "result" not in json.loads(output):
+            print(f"[!] Could not compact the log: {json.loads(output).get('error')}")
+    except Exception as e:
+        print(f"[!] Could not compact the log: {e}")
+
+
+def find_flags(text, regex, ignore=""):
+    """Matches of `regex` in `text`, without placeholders and strings found in `ignore` (the prompt)."""
+    ignore = ignore.lower()
+    for match in regex.finditer(text or ""):
+        flag = match.group(0)
+        body = flag[flag.find("{") + 1:flag.rfind("}")] if "{" in flag and flag.endswith("}") else flag
+        if PLACEHOLDER_FLAG.fullmatch(body) or flag.lower() in ignore:
+            continue
+        yield flag
+
+
+def find_flag(text, flag_regex=FLAG_REGEX, ignore=""):
+    return next(find_flags(text, re.compile(flag_regex, re.IGNORECASE), ignore), None)
+
+
+class FlagWatcher:
+    """
+    Look for the flag while the agent runs: in its streamed output (feed()) and in the
+    observations the sandbox logger appends to <workspace>/logs/*.jsonl, with blob
+    references resolved. found is set on the first match that is neither a placeholder nor
+    part of `ignore` (the prompt). A match is only a candidate: pages and files the agent
+    looks at can contain decoys.
+    """
+    def __init__(self, workspace, flag_regex=FLAG_REGEX, interval=0.5, ignore=""):
+        self.workspace = workspace
+        self.regex = re.compile(flag_regex, re.IGNORECASE)
+        self.ignore = ignore
+        self.interval = interval
+        self.found = threading.Event()
+        self.flag = None
+        self._tail = ""  # end of the previous chunk, for flags split across chunks
+        # journals of earlier runs in a reused workspace are only read from their current end
+        self._offsets = {path: os.path.getsize(path) for path in glob.glob(os.path.join(workspace, "logs", "*.jsonl"))}
+        self._partial = {}
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._watch_logs, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+
+    def _match(self, text):
+        flag = next(find_flags(text, self.regex, self.ignore), None)
+        if flag and not self.found.is_set():
+            self.flag = flag
+            self.found.set()
+        return flag
+
+    def feed(self, text):
+        self._match(self._tail + text)
+        self._tail = (self._tail + text)[-256:]
+
+    def _resolve(self, value):
+        if isinstance(value, dict) and "$blob" in value:
+            try:
+                with open(os.path.join(self.workspace, value["path"]), "rb") as f:
+                    data = f.read()
+                if value.get("compression") == "gzip":
+                    data = gzip.decompress(data)
+                return data.decode("utf-8", errors="replace")
+            except (OSError, KeyError):
+                return ""
+        if isinstance(value, dict):
+            return " ".join(self._resolve(v) for v in value.values())
+        if isinstance(value, list):
+            return " ".join(self._resolve(v) for v in value)
+        return value if isinstance(value, str) else ""
+
+    def _scan_logs(self):
+        for path in glob.glob(os.path.join(self.workspace, "logs", "*.jsonl")):
+            try:
+                with open(path, "rb") as f:
+                    f.seek(self._offsets.get(path, 0))
+                    data = f.read()
+            except OSError:
+                continue
+            self._offsets[path] = self._offsets.get(path, 0) + len(data)
+            lines = (self._partial.pop(path, b"") + data).split(b"\n")
+            self._partial[path] = lines.pop()  # incomplete last line, completed by the next read
+            for line in lines:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                # only what the agent observed: code it writes may contain flag-like regexes
+                if record.get("event") == "observation":
+                    self._match(self._resolve(record.get("raw")))
+                elif record.get("event") == "final_report":
+                    self._match(self._resolve(record.get("value")))
+
+    def _watch_logs(self):
+        while not self._stopped.is_set() and not self.found.is_set():
+            self._scan_logs()
+            self._stopped.wait(self.interval)
+
+
+def run_agent(ctfer, task, workspace, watcher, echo=True):
+    """
+    Run Claude in the sandbox, streaming its output to the console and <workspace>/agent_output.log.
+    Stops the agent as soon as `watcher` finds the flag. Returns the complete output.
+    """
+    # own process group with a known pid, so the whole agent can be stopped from outside
+    cmd = ["setsid", "bash", "-c", 'echo $$ >/tmp/agent.pid; exec "$@"', "agent",
+           "claude", "--dangerously-skip-permissions", "--print", task]
+    res = ctfer.container.exec_run(cmd, workdir="/opt/claude_code", stream=True)
+
+    def stop_on_flag():
+        while not stopped.is_set():
+            if watcher.found.wait(0.5):
+                print(f"[+] 发现疑似flag: {watcher.flag}, 提前结束")
+                ctfer.container.exec_run(["bash", "-c", "kill -TERM -- -$(cat /tmp/agent.pid)"])
+                return
+    stopped = threading.Event()
+    threading.Thread(target=stop_on_flag, daemon=True).start()
+
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    chunks = []
+    try:
+        with open(os.path.join(workspace, "agent_output.log"), "a", encoding="utf-8") as log:
+            for chunk in res.output:
+                text = decoder.decode(chunk)
+                chunks.append(text)
+                log.write(text)
+                log.flush()
+                if echo:
+                    sys.stdout.write(text)
+                    sys.stdout.flush()
+                watcher.feed(text)
+    finally:
+        stopped.set()
+    return "".join(chunks)
+
+
+def vnc_address(ctfer):
+    """Address the sandbox's VNC port is published on: the Docker host it runs on."""
+    host = getattr(ctfer.placement, "host", None)
+    return (urlparse(host.url).hostname if host and host.url else None) or "127.0.0.1"
+
+
+def solve(ctf, workspace, vnc_port=5901, budget=None, flag_regex=FLAG_REGEX, ctfer=None, echo=True, placement=None):
+    """
+    Run one challenge in a fresh sandbox, or in `ctfer` if an already started one (from
+    SandboxPool) is given. `budget` (seconds) stops the container when exceeded; the run
+    also stops early once the flag shows up in the agent's output or observations.
+    `placement` (Placement or ResourceProfile) sets the container's CPU/memory/pids limits.
+    Returns {"status": solved|candidate|unsolved|timeout, "flag", "duration", "log_path", "output"}:
+    solved when the agent's output has the flag, candidate when only the watcher saw one.
+    """
+    started = time.monotonic()
+    task = build_task(ctf)
+
+    if ctfer is None:
+        print("[+] 启动沙盒...")
+        ctfer = Ctfer(vnc_port, workspace, placement=placement)
+    vnc_port = ctfer.vnc_port
+    timed_out = threading.Event()
+    watcher = None
+    def stop():
+        timed_out.set()
+        compact_log(ctfer)
+        ctfer.cleanup()  # ends the agent's output stream
+    timer = threading.Timer(budget, stop) if budget else None
+    if timer:
+        timer.daemon = True
+        timer.start()
+    try:
+        print("[+] 等待沙盒环境和mcp服务就绪...")
+        ctfer.container.exec_run(["bash","wait.sh"], workdir="/opt/claude_code")
+        print("[+] mcp服务已就绪...")
+        print(f"[+] 可以连接 vnc://{vnc_address(ctfer)}:{vnc_port} 查看可视化界面, 密码123456")
+        print(f"[+] 开始解题, 可以打开 {workspace} 查看解题步骤")
+        print(f"[+] 输入提示词：{task}")
+
+        # Initialize structured log inside sandbox before starting Claude
+        init_logger(ctfer, task)
+
+        print(ctfer.container.logs().decode('utf-8'))
+        watcher = FlagWatcher(workspace, flag_regex, ignore=task).start()
+        try:
+            output = run_agent(ctfer, task, workspace, watcher, echo)
+        finally:
+            watcher.stop()
+    except Exception:
+        if not timed_out.is_set():
+            raise
+        output = ""  # the container was stopped under exec_run
+    finally:
+        if timer:
+            timer.cancel()
+        if not timed_out.is_set():  # stop() already did it while the container was running
+            compact_log(ctfer)
+        ctfer.cleanup()
+
+    flag = find_flag(output, flag_regex, ignore=task)
+    candidate = watcher.flag if watcher and not flag else None
+    return {
+        "status": "solved" if flag else "candidate" if candidate else "timeout" if timed_out.is_set() else "unsolved",
+        "flag": flag or candidate,
+        "duration": round(time.monotonic() - started, 1),
+        "log_path": latest_log(workspace),
+        "vnc_port": vnc_port,
+        "output": output,
+    }
+
+
+if __name__ == "__main__":
+    # Main Entry Point: The 100-line Baby Runtime in Action
+    parser = argparse.ArgumentParser(description='CTF Challenge Solver')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--ctf', type=str, help='CTF challenge URL')
+    target.add_argument('--challenges', type=str, help='JSONL/YAML file of challenges, solved in parallel (scheduler mode)')
+    parser.add_argument('--vnc-port', type=int, default=5901, help='VNC port (default: 5901; 0 lets Docker pick one); first port of the range in scheduler mode')
+    parser.add_argument('--workspace', type=str, default="workspace", help='Workspace directory (default: workspace)')
+    parser.add_argument('--flag-regex', type=str, default=FLAG_REGEX, help='Regex used to detect the flag in the output')
+    parser.add_argument('--concurrency', type=int, default=4, help='Scheduler mode: max sandboxes running at once (default: 4)')
+    parser.add_argument('--budget', type=int, default=None, help='Default wall-clock budget per attempt in seconds (default: none)')
+    parser.add_argument('--retries', type=int, default=0, help='Scheduler mode: default retries of an unsolved challenge (default: 0)')
+    parser.add_argument('--warm-pool', type=int, default=0, help='Scheduler mode: sandboxes kept booted and ready ahead of time (default: 0)')
+    parser.add_argument('--cpus', type=float, default=0, help='CPUs per sandbox (default: 0, unlimited); scheduler mode pins them to host cores')
+    parser.add_argument('--mem', type=str, default=None, help='Memory limit per sandbox, e.g. 4g (default: unlimited)')
+    parser.add_argument('--pids-limit', type=int, default=None, help='Max processes per sandbox (default: unlimited)')
+    parser.add_argument('--overcommit', type=float, default=1.0, help='Scheduler mode: max CPU load placed on a host core (default: 1.0)')
+    parser.add_argument('--docker-host', action='append', default=None, help='Scheduler mode: Docker endpoint to run sandboxes on, e.g. tcp://10.0.0.2:2375 or ssh://user@host; repeat to spread over several hosts')
+    parser.add_argument('--results', type=str, default=None, help='Scheduler mode: results JSONL (default: <workspace>/results.jsonl)')
+
+    args = parser.parse_args()
+    workspace = os.path.abspath(args.workspace)
+    profile = ResourceProfile(args.cpus, args.mem, args.pids_limit)
+
+    if args.challenges:
+        from scheduler import Scheduler, load_challenges
+        challenges = load_challenges(args.challenges)
+        # cores are placed if the default profile or any challenge's own profile limits CPUs
+        pin = bool(args.cpus) or any(challenge.get("cpus") for challenge in challenges)
+        scheduler = Scheduler(
+            challenges, workspace,
+            concurrency=args.concurrency, vnc_base_port=args.vnc_port, budget=args.budget,
+            retries=args.retries, flag_regex=args.flag_regex, warm_pool=args.warm_pool,
+            profile=profile,
+            placer=CorePlacer(overcommit=args.overcommit) if pin and not args.docker_host else None,
+            backend=DockerBackend(args.docker_host, overcommit=args.overcommit, pin_cores=pin) if args.docker_host else None,
+            results_path=args.results or os.path.join(workspace, "results.jsonl"),
+        )
+        scheduler.run()
+    else:
+        result = solve(args.ctf, workspace, args.vnc_port or None, args.budget, args.flag_regex, placement=profile)
+        print(f"[+] 结束运行: {result['status']} {result['flag'] or ''}")